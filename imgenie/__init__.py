@@ -2,6 +2,7 @@
 
 from imgenie.image_generator import ImageGenerator
 from imgenie.image_describer import ImageDescriber
+from imgenie.torch_config import configure_cuda_math
 
-__all__ = ["ImageGenerator", "ImageDescriber"]
+__all__ = ["ImageGenerator", "ImageDescriber", "configure_cuda_math"]
 __version__ = "1.0.0"
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+
+
+class FilenameTable(dict):
+    """
+    str.translate table turning prompts into file-name fragments: alphanumerics and the
+    characters in keep pass through, anything else becomes replacement (None drops it).
+
+    Latin-1 is precomputed; other code points are classified with str.isalnum on lookup,
+    so non-Latin letters are kept and symbols, emoji and invisible separators are not.
+    """
+
+    def __init__(self, replacement=None, keep: str = ''):
+        super().__init__()
+        self.replacement = replacement
+        self.keep = keep
+        for code in range(256):
+            self[code] = self._map(code)
+
+    def _map(self, code: int):
+        char = chr(code)
+        return code if char.isalnum() or char in self.keep else self.replacement
+
+    def __missing__(self, code: int):
+        return self._map(code)
@@ -1,10 +1,15 @@
 #!/usr/bin/env python3
 
+import gc
 import io
+import os
+import json
 import time
 import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 
 import numpy as np
 from PIL import Image as PILImage
@@ -16,6 +21,12 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 DEFAULT_MODEL_PATH = "/root/.imgenie/models/fancyfeast.joycaption/weights"
+# The vision tower works on a few hundred pixels; JPEGs are decoded no larger than this
+DECODE_SIZE = 768
+DEFAULT_PROMPT = "Describe the image in detail. Format the response as a single comprehensive paragraph."
+# Checkpoints already quantized offline (e.g. with autoawq); the weights carry their own config
+PREQUANTIZED_FORMATS = ("awq", "gptq")
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.webp', '.bmp'}
 
 
 class ImageDescriber:
@@ -23,13 +34,64 @@ class ImageDescriber:
     def __init__(self,
                  model_path: str = DEFAULT_MODEL_PATH,
                  input_dir: str = "/root/.imgenie/input",
-                 output_dir: str = "/root/.imgenie/output"):
+                 output_dir: str = "/root/.imgenie/output",
+                 quantization: Optional[str] = None,
+                 backend: str = "transformers",
+                 gpu_memory_utilization: float = 0.9,
+                 gpu_decode: bool = False):
         # Setup output directory
         self.input_dir = Path(input_dir)
         self.input_dir.mkdir(parents=True, exist_ok=True)
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
         self.model_path = model_path
+        self.quantization = quantization  # None (bf16), "int8"/"int4" via bitsandbytes, or "awq"/"gptq" checkpoints
+        self.backend = backend  # "transformers" or "vllm"
+        self.gpu_memory_utilization = gpu_memory_utilization  # share of VRAM vLLM may reserve
+        self.gpu_decode = gpu_decode  # decode JPEGs with nvJPEG and preprocess them on the GPU
+        self.i2t_model = None
+        self.llm = None
+        self._prompt_cache: dict = {}  # prompt -> rendered chat template
+
+    def _quantization_config(self):
+        """BitsAndBytesConfig for the requested quantization, or None to load in plain bf16."""
+        if self.quantization is None or self.quantization in PREQUANTIZED_FORMATS:
+            return None
+        if self.quantization not in ("int8", "int4"):
+            logger.warning(f"Unknown quantization '{self.quantization}', loading in bf16.")
+            return None
+        try:
+            import bitsandbytes  # noqa: F401
+            from transformers import BitsAndBytesConfig
+        except ImportError:
+            logger.warning("bitsandbytes is not installed, loading in bf16.")
+            return None
+        if self.quantization == "int8":
+            return BitsAndBytesConfig(load_in_8bit=True)
+        return BitsAndBytesConfig(load_in_4bit=True, bnb_4bit_compute_dtype=torch.bfloat16)
+
+    def _attn_implementation(self) -> str:
+        """FlashAttention-2 when flash-attn is installed, otherwise PyTorch SDPA."""
+        try:
+            import flash_attn  # noqa: F401
+            return "flash_attention_2"
+        except ImportError:
+            return "sdpa"
+
+    def _load_vllm(self) -> bool:
+        """Load the model into a vLLM engine (paged KV cache, CUDA graphs, continuous batching)."""
+        try:
+            from vllm import LLM
+        except ImportError:
+            logger.warning("vllm is not installed, falling back to transformers.")
+            return False
+        self.llm = LLM(model=self.model_path,
+                       dtype="bfloat16",
+                       max_model_len=4096,
+                       gpu_memory_utilization=self.gpu_memory_utilization,
+                       quantization=self.quantization if self.quantization in PREQUANTIZED_FORMATS else None,
+                       enforce_eager=False)
+        return True
 
     def load_model(self) -> bool:
         # Load the pipeline
@@ -37,11 +99,42 @@ class ImageDescriber:
             load_start = time.time()
             # logger.info(f"Loading model: {self.model}")
 
-            self.i2t_processor = AutoProcessor.from_pretrained(self.model_path, local_files_only=True)
-            self.i2t_model = LlavaForConditionalGeneration.from_pretrained(
-                self.model_path,
-                torch_dtype=torch.bfloat16,
-                local_files_only=True).to("cuda:0")
+            # The processor is needed by both backends for the chat template
+            # The fast (torchvision) image processor accepts CUDA tensors from get_image_tensor_from_path
+            self.i2t_processor = AutoProcessor.from_pretrained(self.model_path,
+                                                               use_fast=self.gpu_decode,
+                                                               local_files_only=True)
+            # Left padding keeps the generated tokens aligned when describing in batches
+            self.i2t_processor.tokenizer.padding_side = "left"
+
+            if self.backend == "vllm" and self._load_vllm():
+                load_time = (time.time() - load_start) * 1000
+                logger.info(f"Model loaded into vLLM in {load_time:.2f}ms")
+                return True
+
+            attn_implementation = self._attn_implementation()
+            logger.info(f"Attention implementation: {attn_implementation}")
+            quantization_config = self._quantization_config()
+            if quantization_config is not None or self.quantization in PREQUANTIZED_FORMATS:
+                # Quantized weights are placed by the loader; .to() is not allowed on them.
+                # AWQ/GPTQ checkpoints only quantize the language model, the vision tower stays bf16.
+                self.i2t_model = LlavaForConditionalGeneration.from_pretrained(
+                    self.model_path,
+                    torch_dtype=torch.bfloat16,
+                    attn_implementation=attn_implementation,
+                    quantization_config=quantization_config,
+                    device_map={"": 0},
+                    local_files_only=True)
+                logger.info(f"Model quantized to {self.quantization}")
+            else:
+                # Load shards directly onto the GPU rather than into host RAM and then copying
+                self.i2t_model = LlavaForConditionalGeneration.from_pretrained(
+                    self.model_path,
+                    torch_dtype=torch.bfloat16,
+                    attn_implementation=attn_implementation,
+                    low_cpu_mem_usage=True,
+                    device_map={"": 0},
+                    local_files_only=True)
 
             load_time = (time.time() - load_start) * 1000
             logger.info(f"Model loaded in {load_time:.2f}ms")
@@ -52,20 +145,22 @@ class ImageDescriber:
             return False
 
     def unload_model(self) -> None:
-        if self.i2t_model is not None:
-            del self.i2t_model
+        if self.i2t_model is not None or self.llm is not None:
+            self.i2t_model = None
+            self.llm = None
+            gc.collect()
             torch.cuda.empty_cache()
             logger.info("Model unloaded successfully.")
         else:
             logger.warning("No model to unload.")
 
-    def describe(self, img: PILImage.Image,
-                 prompt: Optional[str] = None) -> dict:
+    def _render_prompt(self, prompt: str) -> str:
+        """Render the chat template for a prompt once; folder runs reuse the same prompt."""
+        convo_string = self._prompt_cache.get(prompt)
+        if convo_string is not None:
+            return convo_string
 
         # Each value in "content" has to be a list of dicts with types ("text", "image")
-        if prompt is None:
-            prompt = "Describe the image in detail. Format the response as a single comprehensive paragraph."
-
         conversation = [
             {
                 "role": "system",
@@ -80,12 +175,34 @@ class ImageDescriber:
         convo_string = self.i2t_processor.apply_chat_template(conversation,
                                                               tokenize=False,
                                                               add_generation_prompt=True)
+        self._prompt_cache[prompt] = convo_string
+        return convo_string
+
+    def describe(self, img: PILImage.Image,
+                 prompt: Optional[str] = None) -> dict:
+        return self.describe_batch([img], prompt=prompt)[0]
+
+    def describe_batch(self, imgs: List[PILImage.Image],
+                       prompt: Optional[str] = None) -> List[dict]:
+        """Describe several images with a single generate() call."""
+
+        if prompt is None:
+            prompt = DEFAULT_PROMPT
+        convo_string = self._render_prompt(prompt)
+
+        if self.llm is not None:
+            return self._describe_batch_vllm(imgs, convo_string)
 
-        # Process the inputs
-        inputs = self.i2t_processor(text=[convo_string],
-                                    images=[img],
-                                    return_tensors="pt").to('cuda:0')
+        # Process the inputs; the prompt is shared so every row has the same text
+        inputs = self.i2t_processor(text=[convo_string] * len(imgs),
+                                    images=imgs,
+                                    padding=True,
+                                    return_tensors="pt")
+        # Pixels go over PCIe as bf16 (half the bytes of fp32); pinned host buffers let
+        # the H2D copies run asynchronously. Integer tensors (ids, mask) keep their dtype.
         inputs['pixel_values'] = inputs['pixel_values'].to(torch.bfloat16)
+        inputs = {k: v if v.is_cuda else v.pin_memory().to('cuda:0', non_blocking=True)
+                  for k, v in inputs.items()}
 
         # Generate the captions
         generate_ids = self.i2t_model.generate(**inputs,
@@ -95,30 +212,145 @@ class ImageDescriber:
                                                use_cache=True,
                                                temperature=0.6,
                                                top_k=None,
-                                               top_p=0.9)[0]
+                                               top_p=0.9)
 
         # Trim off the prompt
-        generate_ids = generate_ids[inputs['input_ids'].shape[1]:]
+        generate_ids = generate_ids[:, inputs['input_ids'].shape[1]:]
 
-        # Decode the caption
-        caption = self.i2t_processor.tokenizer.decode(generate_ids,
-                                                      skip_special_tokens=True,
-                                                      clean_up_tokenization_spaces=False)
-        caption = caption.strip()
+        # Decode the captions
+        captions = self.i2t_processor.tokenizer.batch_decode(generate_ids,
+                                                             skip_special_tokens=True,
+                                                             clean_up_tokenization_spaces=False)
+        return [{"description": caption.strip()} for caption in captions]
 
-        return {"description": caption}
+    def _describe_batch_vllm(self, imgs: List[PILImage.Image], convo_string: str) -> List[dict]:
+        from vllm import SamplingParams
+
+        sampling_params = SamplingParams(temperature=0.6, top_p=0.9, max_tokens=512)
+        requests = [{"prompt": convo_string, "multi_modal_data": {"image": img}} for img in imgs]
+        outputs = self.llm.generate(requests, sampling_params, use_tqdm=False)
+        return [{"description": output.outputs[0].text.strip()} for output in outputs]
+
+    def _open_rgb(self, fp) -> PILImage.Image:
+        img = PILImage.open(fp)
+        # JPEGs can be scaled down during decode (DCT domain), skipping full-resolution pixels
+        img.draft("RGB", (DECODE_SIZE, DECODE_SIZE))
+        # Decoders already emit RGB for most JPEGs/PNGs; convert() would only copy them
+        img.load()
+        return img if img.mode == "RGB" else img.convert("RGB")
 
     def get_image_from_bytes(self, img_data: bytes) -> PILImage.Image:
-        return PILImage.open(io.BytesIO(img_data)).convert("RGB")
+        return self._open_rgb(io.BytesIO(img_data))
+
+    def get_image_from_stream(self, stream) -> PILImage.Image:
+        return self._open_rgb(stream)
 
     def get_image_from_array(self, img_array: np.ndarray) -> PILImage.Image:
         return PILImage.fromarray(img_array.astype("uint8")).convert("RGB")
 
     def get_image_from_path(self, img_path: str) -> PILImage.Image:
-        return PILImage.open(img_path).convert("RGB")
+        return self._open_rgb(img_path)
+
+    def get_image_tensor_from_path(self, img_path: str):
+        """
+        Decode a JPEG straight into a CHW uint8 CUDA tensor with nvJPEG.
+
+        Other formats, or a missing torchvision, fall back to the PIL loader.
+        """
+        if Path(img_path).suffix.lower() not in ('.jpg', '.jpeg'):
+            return self.get_image_from_path(img_path)
+        try:
+            from torchvision.io import ImageReadMode, decode_jpeg, read_file
+        except ImportError:
+            return self.get_image_from_path(img_path)
+        return decode_jpeg(read_file(img_path), mode=ImageReadMode.RGB, device='cuda:0')
+
+    def describe_folder(self, folder_path: str,
+                        batch_size: int = 4,
+                        output_format: str = "txt",
+                        prefetch_batches: int = 2) -> int:
+        """
+        Describe every image in a folder and write the captions to output_dir.
+
+        output_format "txt" writes one <stem>.txt per image; "jsonl" appends all
+        captions to a single descriptions.jsonl, avoiding a file create per image.
+        Up to prefetch_batches batches are decoded ahead of the one on the GPU.
+        Returns the number of images described.
+        """
+        img_files = sorted(Path(entry.path) for entry in os.scandir(folder_path)
+                           if entry.is_file() and Path(entry.name).suffix.lower() in IMAGE_EXTENSIONS)
+
+        jsonl_file = None
+        if output_format == "jsonl":
+            jsonl_file = open(self.output_dir / "descriptions.jsonl", 'a', buffering=1 << 20)
+
+        batches = [img_files[start:start + batch_size] for start in range(0, len(img_files), batch_size)]
+
+        # PIL releases the GIL while decoding, so upcoming batches are decoded on worker
+        # threads while the GPU captions the current one. The queue depth bounds how many
+        # decoded images are held in memory at once.
+        decoder = ThreadPoolExecutor(max_workers=max(1, batch_size))
+        load_image = self.get_image_tensor_from_path if self.gpu_decode else self.get_image_from_path
+        pending = deque()
+
+        def submit(batch_index: int) -> None:
+            if batch_index < len(batches):
+                pending.append([decoder.submit(load_image, str(f)) for f in batches[batch_index]])
+
+        for batch_index in range(max(1, prefetch_batches)):
+            submit(batch_index)
+
+        described = 0
+        try:
+            for index, batch_files in enumerate(batches):
+                futures = pending.popleft()
+                submit(index + max(1, prefetch_batches))
+                # A file that fails to decode only drops itself from the batch
+                imgs, img_files = [], []
+                for img_file, future in zip(batch_files, futures):
+                    try:
+                        imgs.append(future.result())
+                        img_files.append(img_file)
+                    except Exception as e:
+                        logger.error(f"Error processing image {img_file.name}: {e}")
+                if not imgs:
+                    continue
+
+                try:
+                    described_files = list(zip(img_files, self.describe_batch(imgs)))
+                except Exception as e:
+                    # Retry one by one so a single bad image doesn't cost the rest their captions
+                    logger.error(f"Error processing images {[f.name for f in img_files]}: {e}")
+                    described_files = []
+                    for img_file, img in zip(img_files, imgs):
+                        try:
+                            described_files.append((img_file, self.describe_batch([img])[0]))
+                        except Exception as e:
+                            logger.error(f"Error processing image {img_file.name}: {e}")
+
+                for img_file, result in described_files:
+                    logger.info(f"Image: {img_file.name} - Description: {result['description']}")
+                    if jsonl_file is not None:
+                        jsonl_file.write(json.dumps({"file": img_file.name,
+                                                     "description": result['description']}) + "\n")
+                    else:
+                        # Save description to a text file
+                        desc_file = self.output_dir / f"{img_file.stem}.txt"
+                        with open(desc_file, 'w') as f:
+                            f.write(result['description'])
+                    described += 1
+        finally:
+            decoder.shutdown(cancel_futures=True)
+            if jsonl_file is not None:
+                jsonl_file.close()
+
+        return described
 
 
 if __name__ == "__main__":
+    from torch_config import configure_cuda_math
+    configure_cuda_math()
+
     # Load model and wait for user prompt.
     server = ImageDescriber()
     server.load_model()
@@ -135,19 +367,10 @@ if __name__ == "__main__":
     # Ask for a folder path and describe all images in it
     folder_path = input("Enter folder path containing images (or 'exit' to quit): ")
     if folder_path.lower() != 'exit':
-        folder = Path(folder_path)
-        for img_file in folder.glob("*.*"):
-            try:
-                img = server.get_image_from_path(str(img_file))
-                result = server.describe(img)
-                print(f"Image: {img_file.name} - Description: {result['description']}")
-                # Save description to a text file
-                desc_file = server.output_dir / f"{img_file.stem}.txt"
-                with open(desc_file, 'w') as f:
-                    f.write(result['description'])
-
-            except Exception as e:
-                logger.error(f"Error processing image {img_file.name}: {e}")
+        output_format = input("Output format [txt/jsonl] (default txt): ").strip().lower() or "txt"
+        batch_size = int(input("Batch size (default 4): ").strip() or 4)
+        count = server.describe_folder(folder_path, batch_size=batch_size, output_format=output_format)
+        print(f"Described {count} images. Descriptions saved to {server.output_dir}")
     else:
         print("Exiting...")
         exit()
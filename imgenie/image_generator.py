@@ -1,13 +1,26 @@
 #!/usr/bin/env python3
 
+import gc
+import time
+import inspect
 import logging
-from os import path
+import weakref
+import threading
+from collections import OrderedDict
+from itertools import chain
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from os import environ, path, scandir, stat
 from pathlib import Path
 from datetime import datetime
-from typing import Optional, Union
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple, Union
 import yaml as yf   # to avoid conflict with PyYAML
 
+import numpy as np
 import torch
+import torch.nn.functional as F
+from torch.nn.attention import SDPBackend, sdpa_kernel
 from PIL import Image
 from diffusers import (
     ZImageImg2ImgPipeline,
@@ -16,26 +29,187 @@ from diffusers import (
     StableDiffusionImg2ImgPipeline,
     UNet2DConditionModel
 )
+from safetensors import safe_open
 from safetensors.torch import load_file
 
+# Run as a script (server, CLI) or imported as part of the imgenie package
+try:
+    from filename_table import FilenameTable
+    from image_io import save_png_async
+except ImportError:
+    from imgenie.filename_table import FilenameTable
+    from imgenie.image_io import save_png_async
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 DEFAULT_MODEL_PATH = "/root/.imgenie/models/TongyiMAI.ZImageTurbo/"
+INDUCTOR_CACHE_DIR = path.expanduser("~/.cache/imgenie/inductor")
+# Reference image heights at 720 wide (16:9, 4:3, 1:1, 3:4, 9:16) used when the pipeline is compiled
+REFERENCE_HEIGHTS = (400, 544, 720, 960, 1280)
+
+# ZImage modules that are never modified after loading (LoRAs and custom checkpoints only
+# touch the transformer), shared between generators loaded from the same base directory
+# with the same quantization and dtype
+SHARED_ZIMAGE_COMPONENTS = ("vae", "text_encoder", "tokenizer")
+_shared_modules: "weakref.WeakValueDictionary" = weakref.WeakValueDictionary()
+# Every ImageGenerator, so parking one can leave modules another one is still using on the GPU
+_generators: "weakref.WeakSet" = weakref.WeakSet()
+
+# Text-encoder outputs kept per generator; prompts and negatives repeat across requests
+PROMPT_EMBEDS_CACHE_SIZE = 32
+
+# LoRA adapters kept loaded (active or not) so switching back to one skips the disk read
+MAX_LOADED_ADAPTERS = 8
+
+# Approximate cache: a prompt close enough to an earlier one starts img2img from that
+# result at this strength, so only that fraction of the denoising steps runs
+APPROX_CACHE_SIZE = 16
+APPROX_CACHE_STRENGTH = 0.5
+
+# SDPA backend priority on CUDA: flash, then memory-efficient, with math last for the
+# shapes/dtypes/architectures (e.g. some ROCm GPUs) neither fused kernel supports. Only applied
+# where sdpa_kernel takes set_priority (torch >= 2.6); otherwise the list order is ignored and,
+# with math allowed, the context would change nothing
+SDPA_BACKENDS = [SDPBackend.FLASH_ATTENTION, SDPBackend.EFFICIENT_ATTENTION, SDPBackend.MATH]
+_SDPA_SET_PRIORITY = "set_priority" in inspect.signature(sdpa_kernel).parameters
+
+# Quantization schemes applied to the denoiser with torchao after loading (nf4 goes through bitsandbytes)
+TORCHAO_QUANTIZATIONS = ("fp8", "int8")
+
+# Threads (each with its own CUDA stream) reading single-file checkpoints onto the GPU
+WEIGHT_LOAD_WORKERS = 4
+
+# libyaml-backed loader when PyYAML was built with it
+YamlLoader = getattr(yf, 'CSafeLoader', yf.SafeLoader)
+
+_yaml_config_cache: Dict[str, Tuple[int, Mapping]] = {}
+_lora_listings: Dict[str, Tuple[int, frozenset]] = {}  # dir -> (mtime_ns, LoRA names)
+
+# Drops every character that isn't alphanumeric, space or underscore from file names
+_SAFE_FILENAME_TABLE = FilenameTable(keep=' _')
+
+
+def lora_names(lora_dir) -> frozenset:
+    """Names of the .safetensors files in lora_dir, rescanned only when the directory changes; empty if missing."""
+    lora_dir = str(lora_dir)
+    try:
+        mtime_ns = stat(lora_dir).st_mtime_ns
+    except OSError:
+        return frozenset()
+    cached = _lora_listings.get(lora_dir)
+    if cached is None or cached[0] != mtime_ns:
+        with scandir(lora_dir) as entries:
+            names = frozenset(e.name[:-len('.safetensors')] for e in entries
+                              if e.name.endswith('.safetensors') and e.is_file())
+        cached = _lora_listings[lora_dir] = (mtime_ns, names)
+    return cached[1]
+
+
+def load_yaml_config(yaml_path: str) -> Mapping:
+    """Parse a prompt config, reusing the previous result while the file is unchanged."""
+    mtime_ns = Path(yaml_path).stat().st_mtime_ns
+    cached = _yaml_config_cache.get(yaml_path)
+    if cached is not None and cached[0] == mtime_ns:
+        return cached[1]
+
+    with open(yaml_path, 'r') as f:
+        config = MappingProxyType(yf.load(f, Loader=YamlLoader) or {})
+    _yaml_config_cache[yaml_path] = (mtime_ns, config)
+    return config
+
+
+def _thread_streams(workers: int):
+    """
+    One CUDA stream per pool thread, each ordered after the work already queued on the current
+    stream. Returns the streams and a function giving the calling thread its stream.
+    """
+    streams = [torch.cuda.Stream() for _ in range(workers)]
+    for stream in streams:
+        stream.wait_stream(torch.cuda.current_stream())
+    unclaimed = iter(streams)
+    local = threading.local()
+
+    def thread_stream() -> torch.cuda.Stream:
+        if not hasattr(local, "stream"):
+            local.stream = next(unclaimed)
+        return local.stream
+    return streams, thread_stream
+
+
+def _join_streams(streams) -> None:
+    for stream in streams:
+        torch.cuda.current_stream().wait_stream(stream)
+    torch.cuda.synchronize()
+
+
+def _load_safetensors(file_path: str, device: str = "cuda", workers: int = WEIGHT_LOAD_WORKERS) -> Dict[str, torch.Tensor]:
+    """
+    Read a .safetensors checkpoint straight onto device. Tensors are read by a small thread
+    pool into pinned buffers and copied on per-thread streams, so disk reads and PCIe copies
+    overlap instead of loading the whole file into host RAM first.
+    """
+    streams, thread_stream = _thread_streams(workers)
+
+    with safe_open(file_path, framework="pt", device="cpu") as f:
+        def read(key):
+            host = f.get_tensor(key).pin_memory()
+            with torch.cuda.stream(thread_stream()):
+                return key, host.to(device, non_blocking=True)
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='imgenie-weights') as pool:
+            state_dict = dict(pool.map(read, f.keys()))
+
+    _join_streams(streams)
+    return state_dict
+
+
+def _copy_safetensors(file_path: str, targets: Mapping[str, torch.Tensor], rename=lambda key: key,
+                      workers: int = WEIGHT_LOAD_WORKERS) -> int:
+    """
+    Overwrite existing tensors (e.g. a resident module's state_dict()) with a checkpoint's,
+    tensor by tensor, so no second copy of the weights is staged in VRAM. Reads and copies
+    overlap as in _load_safetensors. Keys whose rename(key) has no target are skipped.
+    Returns the number of tensors copied.
+    """
+    streams, thread_stream = _thread_streams(workers)
+
+    with safe_open(file_path, framework="pt", device="cpu") as f:
+        def copy(key) -> int:
+            target = targets.get(rename(key))
+            if target is None:
+                return 0
+            source = f.get_tensor(key)
+            if source.shape != target.shape:
+                raise ValueError(f"Shape mismatch for {key}: checkpoint {tuple(source.shape)}, model {tuple(target.shape)}")
+            host = source.pin_memory()
+            with torch.cuda.stream(thread_stream()):
+                target.copy_(host, non_blocking=True)
+            return 1
+
+        with torch.no_grad(), ThreadPoolExecutor(max_workers=workers, thread_name_prefix='imgenie-weights') as pool:
+            copied = sum(pool.map(copy, f.keys()))
+
+    _join_streams(streams)
+    return copied
 
 
 class ImageGenerator:
     """Image-to-Image editor using reference image and text prompts."""
 
-    _active_loras: list = []
-
     def __init__(self,
                  model_path=DEFAULT_MODEL_PATH,
                  input_dir: str = "/root/.imgenie/input",
                  output_dir: str = "/root/.imgenie/output", 
                  lora_path: str = "/root/.imgenie/loras",
-                 base_model_path: Optional[str] = None):
+                 base_model_path: Optional[str] = None,
+                 deepcache_interval: Optional[int] = None,
+                 compile_model: Union[bool, str] = False,
+                 vae_tiling: bool = False,
+                 approx_cache_threshold: Optional[float] = None,
+                 quantization: Optional[str] = None,
+                 lora_step_cutoff: Optional[float] = None):
 
         self.input_dir = Path(input_dir)
         self.input_dir.mkdir(parents=True, exist_ok=True)
@@ -46,10 +220,42 @@ class ImageGenerator:
         self.base_model_path = base_model_path  # Base model for UNet-only checkpoints
         self.is_single_file_model = False  # Track if model is loaded from .safetensors
         self.is_unet_only = False  # Track if .safetensors contains only UNet weights
+        self.deepcache_interval = deepcache_interval  # UNet feature-cache interval (SD pipelines only)
+        self._deepcache = None
+        self.compile_model = compile_model  # torch.compile the denoiser after loading; True or a torch.compile mode
+        self.vae_tiling = vae_tiling  # tiled VAE decode for large or batched outputs
+        self.approx_cache_threshold = approx_cache_threshold  # prompt cosine similarity for reuse; None disables
+        self._approx_cache: "OrderedDict[str, tuple]" = OrderedDict()  # prompt -> (vector, image)
+        self.quantization = quantization  # None (bf16), "nf4" for ZImage models, "fp8" (Ada/Hopper) or "int8"
+        self._quantized = False
+        self.lora_step_cutoff = lora_step_cutoff  # fraction of steps LoRAs stay active for; None applies them throughout
+        self._prompt_embeds: "OrderedDict[str, list]" = OrderedDict()
+        self._lora_fused = False
+        # Initial noise is drawn on the CPU: seeds reproduce across GPUs and sharded pipelines,
+        # and the pipeline copies the small latent tensor to the device asynchronously
+        self._rng = torch.Generator(device="cpu")
+        self._companion = None  # txt2img (ZImage) or img2img (SD) view of self.pipeline
+        self.last_seed: Optional[int] = None
+        self._active_loras: list = []
+        self._active_lora_weights: list = []  # (path, weight) pairs currently applied
+        self._loaded_adapters: "OrderedDict[str, str]" = OrderedDict()  # absolute path -> adapter name
+        self._adapter_counter = 0
 
         self.pipeline: Optional[Union[ZImageImg2ImgPipeline, ZImagePipeline, StableDiffusionPipeline, StableDiffusionImg2ImgPipeline]] = None
+        self.parked = False  # weights moved to pinned host memory by park()
+        self.parked_bytes = 0
+        _generators.add(self)
 
     def load_model(self) -> bool:
+        if not self._load_pipeline():
+            return False
+        self._configure_vae()
+        self._apply_torchao()
+        self._enable_deepcache()
+        self._compile_pipeline()
+        return True
+
+    def _load_pipeline(self) -> bool:
         try:
             logger.info(f"Loading base model: {self.model_path}")
             
@@ -58,8 +264,9 @@ class ImageGenerator:
                 logger.info("Detected single .safetensors file. Analyzing structure...")
                 
                 try:
-                    state_dict = load_file(self.model_path)
-                    keys_list = list(state_dict.keys())
+                    # Key names come from the header; tensors are only read once the layout is known
+                    with safe_open(self.model_path, framework="pt", device="cpu") as f:
+                        keys_list = list(f.keys())
                     
                     # Detect model type based on key structure
                     has_context_refiner = any('context_refiner' in k for k in keys_list)
@@ -84,27 +291,21 @@ class ImageGenerator:
                         
                         logger.info(f"Loading base ZImage model from: {self.base_model_path}")
                         # Load the base ZImage model
-                        self.pipeline = ZImageImg2ImgPipeline.from_pretrained(
-                            self.base_model_path,
-                            torch_dtype=torch.bfloat16,
-                            use_safetensors=True,
-                            local_files_only=True
-                        ).to("cuda:0")
+                        # The custom weights are copied into the transformer below, so it can't be quantized
+                        self.pipeline = self._load_zimage_pipeline(self.base_model_path, quantize=False)
                         
                         # Replace the transformer (diffusion model) with custom checkpoint
                         logger.info("Loading custom transformer model from safetensors...")
                         # For ZImage models, the state dict keys are prefixed with 'model.diffusion_model.'
-                        # We need to strip this prefix to load into the pipeline's transformer
-                        mapped_state_dict = {}
-                        for key, value in state_dict.items():
-                            if key.startswith('model.diffusion_model.'):
-                                new_key = key.replace('model.diffusion_model.', '')
-                                mapped_state_dict[new_key] = value
-                            else:
-                                # Keep keys as-is if they don't have the prefix
-                                mapped_state_dict[key] = value
-                        
-                        self.pipeline.transformer.load_state_dict(mapped_state_dict, strict=False)
+                        # We need to strip this prefix to load into the pipeline's transformer.
+                        # Copied into the resident weights one tensor at a time, so the checkpoint
+                        # never sits in VRAM next to the base transformer
+                        prefix = 'model.diffusion_model.'
+                        targets = self.pipeline.transformer.state_dict()
+                        copied = _copy_safetensors(
+                            self.model_path, targets,
+                            rename=lambda key: key[len(prefix):] if key.startswith(prefix) else key)
+                        logger.info(f"Replaced {copied} of {len(targets)} transformer tensors.")
                         self.is_single_file_model = True
                         self.is_unet_only = True
                         logger.info("Model loaded successfully with custom transformer weights.")
@@ -119,17 +320,23 @@ class ImageGenerator:
                             self.base_model_path = "runwayml/stable-diffusion-v1-5"
                         
                         logger.info(f"Loading base model: {self.base_model_path}")
+                        # Weights are placed on the GPU as they load, without a full copy in host RAM
                         self.pipeline = StableDiffusionPipeline.from_pretrained(
                             self.base_model_path,
                             torch_dtype=torch.bfloat16,
-                            local_files_only=False
-                        ).to("cuda:0")
+                            local_files_only=False,
+                            low_cpu_mem_usage=True,
+                            device_map="cuda"
+                        )
                         
                         # Load and replace the UNet
                         logger.info("Loading custom UNet from safetensors...")
-                        unet = UNet2DConditionModel.from_config(self.pipeline.unet.config)
-                        unet.load_state_dict(state_dict)
-                        self.pipeline.unet = unet
+                        state_dict = _load_safetensors(self.model_path, self.pipeline.device)
+                        # Build the module without initialising weights and adopt the checkpoint tensors as-is
+                        with torch.device("meta"):
+                            unet = UNet2DConditionModel.from_config(self.pipeline.unet.config)
+                        unet.load_state_dict(state_dict, assign=True)
+                        self.pipeline.unet = unet.to(self.pipeline.device, dtype=torch.bfloat16)
                         
                         self.is_single_file_model = True
                         self.is_unet_only = True
@@ -155,11 +362,7 @@ class ImageGenerator:
             else:
                 # Load from directory (ZImage model structure)
                 logger.info("Loading model from directory structure")
-                self.pipeline = ZImageImg2ImgPipeline.from_pretrained(
-                    self.model_path,
-                    torch_dtype=torch.bfloat16,
-                    use_safetensors=True,
-                    local_files_only=True).to("cuda:0")
+                self.pipeline = self._load_zimage_pipeline(self.model_path)
                 self.is_single_file_model = False
             
             logger.info("Model loaded successfully.")
@@ -169,68 +372,437 @@ class ImageGenerator:
             logger.error(f"Error loading model: {e}")
             return False
 
+    def _quantization_config(self):
+        """NF4 config for the transformer and text encoder, or None to load in bf16."""
+        if self.quantization is None or self.quantization in TORCHAO_QUANTIZATIONS:
+            return None
+        if self.quantization != "nf4":
+            logger.warning(f"Unknown quantization '{self.quantization}', loading in bf16.")
+            return None
+        try:
+            import bitsandbytes  # noqa: F401
+            from diffusers.quantizers import PipelineQuantizationConfig
+        except ImportError:
+            logger.warning("bitsandbytes is not installed, loading in bf16.")
+            return None
+        return PipelineQuantizationConfig(
+            quant_backend="bitsandbytes_4bit",
+            quant_kwargs={"load_in_4bit": True,
+                          "bnb_4bit_quant_type": "nf4",
+                          "bnb_4bit_compute_dtype": torch.bfloat16},
+            components_to_quantize=["transformer", "text_encoder"])
+
+    def _apply_torchao(self) -> None:
+        """Quantize the denoiser's linear layers with torchao: FP8 on Ada/Hopper, int8 weights otherwise."""
+        if self.quantization not in TORCHAO_QUANTIZATIONS:
+            return
+        if not torch.cuda.is_available():
+            logger.warning(f"{self.quantization} requested without a CUDA device. Keeping bf16.")
+            return
+        try:
+            from torchao.quantization import (quantize_, float8_dynamic_activation_float8_weight,
+                                              int8_weight_only)
+        except ImportError:
+            logger.warning("torchao is not installed, keeping bf16.")
+            return
+
+        denoiser = getattr(self.pipeline, "transformer", None) or getattr(self.pipeline, "unet", None)
+        if denoiser is None:
+            return
+        scheme = self.quantization
+        if scheme == "fp8" and torch.cuda.get_device_capability() < (8, 9):
+            # No FP8 tensor cores before compute capability 8.9; int8 weights still halve the bandwidth
+            logger.warning("GPU has no FP8 tensor cores (needs compute capability >= 8.9), using int8 weights instead.")
+            scheme = "int8"
+        quantize_(denoiser, float8_dynamic_activation_float8_weight() if scheme == "fp8" else int8_weight_only())
+        self._quantized = True
+        logger.info(f"Denoiser linear layers quantized to {scheme}.")
+
+    def _load_zimage_pipeline(self, model_dir: str, quantize: bool = True) -> ZImageImg2ImgPipeline:
+        """Load a ZImage pipeline, reusing modules another resident generator already has on the GPU."""
+        quantization_config = self._quantization_config() if quantize else None
+        if quantization_config is not None:
+            logger.info("Loading transformer and text encoder in NF4.")
+            self._quantized = True
+
+        # An NF4 text encoder must not be handed to a bf16 pipeline (or the reverse)
+        dtype = torch.bfloat16
+        share_key = (model_dir, "nf4" if quantization_config is not None else None, dtype)
+        shared = {}
+        for name in SHARED_ZIMAGE_COMPONENTS:
+            module = _shared_modules.get((*share_key, name))
+            if module is not None:
+                shared[name] = module
+        if shared:
+            logger.info(f"Reusing loaded components: {', '.join(shared)}")
+
+        # With several GPUs, spread text encoder, transformer and VAE across them by free memory
+        device_map = "balanced" if torch.cuda.device_count() > 1 else "cuda"
+        if device_map == "balanced":
+            logger.info(f"Sharding pipeline components across {torch.cuda.device_count()} GPUs.")
+
+        # Safetensors shards are mmap'd and copied tensor by tensor straight to the GPU,
+        # instead of materialising the whole model in host RAM first
+        pipeline = ZImageImg2ImgPipeline.from_pretrained(
+            model_dir,
+            torch_dtype=dtype,
+            use_safetensors=True,
+            local_files_only=True,
+            low_cpu_mem_usage=True,
+            device_map=device_map,
+            quantization_config=quantization_config,
+            **shared)
+
+        for name in SHARED_ZIMAGE_COMPONENTS:
+            _shared_modules[(*share_key, name)] = getattr(pipeline, name)
+        return pipeline
+
+    def _configure_vae(self) -> None:
+        """Decode batches one image at a time, and optionally in tiles, to bound VAE peak memory."""
+        vae = self.pipeline.vae
+        vae.enable_slicing()
+        if self.vae_tiling:
+            vae.enable_tiling()
+            logger.info("VAE tiling enabled.")
+
+    def _enable_deepcache(self) -> None:
+        """Reuse high-level UNet features across denoising steps (Stable Diffusion pipelines only)."""
+        if not self.deepcache_interval or not isinstance(self.pipeline, StableDiffusionPipeline):
+            return
+        try:
+            from DeepCache import DeepCacheSDHelper
+        except ImportError:
+            logger.warning("DeepCache is not installed; generating without UNet feature caching.")
+            return
+
+        self._deepcache = DeepCacheSDHelper(pipe=self.pipeline)
+        self._deepcache.set_params(cache_interval=int(self.deepcache_interval), cache_branch_id=0)
+        self._deepcache.enable()
+        logger.info(f"DeepCache enabled (cache_interval={self.deepcache_interval}).")
+
+    def _compile_pipeline(self) -> None:
+        """torch.compile the denoiser and move the conv-heavy modules to channels_last."""
+        if not self.compile_model:
+            return
+        if not torch.cuda.is_available() or torch.cuda.get_device_capability()[0] < 7:
+            logger.warning("torch.compile requested but no CUDA device with compute capability >= 7.0. Skipping.")
+            return
+        if self._deepcache is not None:
+            logger.warning("torch.compile is not combined with DeepCache. Skipping compilation.")
+            return
+
+        # Persist compiled kernels (and max-autotune results) between server restarts
+        environ.setdefault("TORCHINDUCTOR_CACHE_DIR", INDUCTOR_CACHE_DIR)
+        # "max-autotune" benchmarks matmul/conv kernels too: much slower first load, faster steps
+        mode = self.compile_model if isinstance(self.compile_model, str) else "reduce-overhead"
+
+        self.pipeline.vae.to(memory_format=torch.channels_last)
+        if getattr(self.pipeline, "unet", None) is not None:
+            self.pipeline.unet.to(memory_format=torch.channels_last)
+            self.pipeline.unet = torch.compile(self.pipeline.unet, mode=mode, fullgraph=False, dynamic=False)
+        elif getattr(self.pipeline, "transformer", None) is not None:
+            self.pipeline.transformer = torch.compile(self.pipeline.transformer, mode=mode, fullgraph=False, dynamic=False)
+        self.pipeline.vae.decode = torch.compile(self.pipeline.vae.decode, mode=mode, fullgraph=False, dynamic=False)
+        logger.info(f"Pipeline denoiser and VAE decoder compiled with torch.compile (mode={mode}).")
+        self._warmup()
+
+    def _warmup(self) -> None:
+        """Run a short generation at the default size so the first request doesn't pay for tracing."""
+        try:
+            warmup_start = time.time()
+            self.generate("warmup", num_inference_steps=2, height=720, width=720, seed=0)
+            logger.info(f"Compiled pipeline warmed up in {time.time() - warmup_start:.1f}s")
+        except Exception as e:
+            logger.warning(f"Warmup generation failed: {e}")
+        finally:
+            self.last_seed = None
+
     def unload_model(self) -> None:
+        self._prompt_embeds.clear()
+        self._approx_cache.clear()
+        self._companion = None
+        if self._deepcache is not None:
+            self._deepcache.disable()
+            self._deepcache = None
         if self.pipeline is not None:
             del self.pipeline
+            # Diffusers modules reference each other in cycles; collect them so their blocks are really free
+            gc.collect()
             torch.cuda.empty_cache()
             logger.info("Model pipeline unloaded and GPU cache cleared.")
         else:
             logger.warning("No model pipeline to unload.")
         self.pipeline = None
+        self.parked = False
+        self.parked_bytes = 0
+
+    def park(self) -> bool:
+        """
+        Move the pipeline's weights to pinned host memory, freeing VRAM while keeping the model
+        ready for restore(). Returns False (nothing moved) for quantized or multi-GPU pipelines,
+        which can't be moved as a whole and have to be unloaded instead.
+        """
+        if self.pipeline is None or self.parked or self._quantized:
+            return False
+        device_map = getattr(self.pipeline, "hf_device_map", None) or {}
+        if len(set(device_map.values())) > 1:
+            return False
+
+        in_use = {id(module) for other in _generators
+                  if other is not self and other.pipeline is not None and not other.parked
+                  for module in other.pipeline.components.values()}
+        # Embeddings live on the GPU and are cheap to recompute
+        self._prompt_embeds.clear()
+        self.parked_bytes = 0
+        for module in self.pipeline.components.values():
+            if isinstance(module, torch.nn.Module) and id(module) not in in_use:
+                module.to("cpu")
+                # Pinned pages let restore() copy back with async DMA
+                for tensor in chain(module.parameters(), module.buffers()):
+                    tensor.data = tensor.data.pin_memory()
+                    self.parked_bytes += tensor.numel() * tensor.element_size()
+        self.parked = True
+        torch.cuda.empty_cache()
+        logger.info("Model parked in host memory.")
+        return True
+
+    def restore(self) -> bool:
+        """Move parked weights back to the GPU."""
+        if self.pipeline is None or not self.parked:
+            return self.pipeline is not None
+        restore_start = time.time()
+        for module in self.pipeline.components.values():
+            if isinstance(module, torch.nn.Module):
+                module.to("cuda", non_blocking=True)
+        torch.cuda.synchronize()
+        self.parked = False
+        self.parked_bytes = 0
+        logger.info(f"Model restored from host memory in {time.time() - restore_start:.1f}s")
+        return True
 
     def load_loras(self, loras: list, weights: Optional[list] = None) -> None:
-        """Loads multiple LoRA adapters into the pipeline correctly from local files."""
+        """Activates LoRA adapters from local files, keeping earlier ones loaded for reuse."""
         if self.pipeline is None:
             raise ValueError("Model pipeline is not loaded.")
 
-        # First, unload existing loras
-        if self._active_loras:
-            self.pipeline.unload_lora_weights()
-            self._active_loras = []
+        # Same adapters at the same weights: keep the fused pipeline as it is
+        requested = list(zip(loras, weights or [None] * len(loras)))
+        if requested == self._active_lora_weights:
+            return
+
+        # Cached embeddings may come from a text encoder the old adapters modified
+        self._prompt_embeds.clear()
+        self._approx_cache.clear()
+
+        # Adapter weights can only be changed while they are unfused
+        if self._lora_fused:
+            self.pipeline.unfuse_lora()
+            self._lora_fused = False
 
         if not loras:
+            if self._loaded_adapters:
+                self.pipeline.disable_lora()
+            self._active_loras = []
+            self._active_lora_weights = []
             return
 
-        # load added loras
-        for i, path_str in enumerate(loras):
-            path = Path(path_str)
-            adapter_name = f"adapter_{i}"
-            # We pass the PARENT directory as the first argument,
-            # and the specific filename as weight_name.
-            self.pipeline.load_lora_weights(
-                str(path.parent),
-                weight_name=path.name,
-                adapter_name=adapter_name
-            )
+        # Several new files are read from disk concurrently; injecting them into the model stays sequential
+        new_files = [key for key in dict.fromkeys(map(path.abspath, loras)) if key not in self._loaded_adapters]
+        prefetched = {}
+        if len(new_files) > 1:
+            with ThreadPoolExecutor(max_workers=min(8, len(new_files))) as pool:
+                prefetched = dict(zip(new_files, pool.map(load_file, new_files)))
+
+        # Load only adapters that aren't resident yet; the rest are reused by name
+        adapter_names = []
+        for path_str in loras:
+            key = path.abspath(path_str)
+            adapter_name = self._loaded_adapters.get(key)
+            if adapter_name is None:
+                lora_file = Path(key)
+                adapter_name = f"adapter_{self._adapter_counter}"
+                self._adapter_counter += 1
+                if key in prefetched:
+                    self.pipeline.load_lora_weights(prefetched.pop(key), adapter_name=adapter_name)
+                else:
+                    # We pass the PARENT directory as the first argument,
+                    # and the specific filename as weight_name.
+                    self.pipeline.load_lora_weights(
+                        str(lora_file.parent),
+                        weight_name=lora_file.name,
+                        adapter_name=adapter_name
+                    )
+                self._loaded_adapters[key] = adapter_name
+            self._loaded_adapters.move_to_end(key)
+            adapter_names.append(adapter_name)
+
+        # Keep a bounded number of inactive adapters around, dropping the least recently used
+        stale = [key for key, name in self._loaded_adapters.items() if name not in adapter_names]
+        while len(self._loaded_adapters) > MAX_LOADED_ADAPTERS and stale:
+            self.pipeline.delete_adapters(self._loaded_adapters.pop(stale.pop(0)))
 
         self._active_loras = loras.copy()
         logger.info(f"Active LoRAs after update: {self._active_loras}")
 
         # Set default weights
-        self.pipeline.set_adapters([f"adapter_{i}" for i in range(len(loras))], adapter_weights=weights)
+        self.pipeline.enable_lora()
+        self.pipeline.set_adapters(adapter_names, adapter_weights=weights)
 
-    def _load_reference_image(self, image_path: str) -> Image.Image:
-        """Load and validate reference image."""
+        # Fold the weighted adapters into the base weights so denoising steps skip the low-rank matmuls
+        # (4-bit, FP8 and int8 weights can't absorb them; quantized models keep the adapters separate,
+        # as do step-gated LoRAs, which are switched off part way through each generation)
+        if not self._quantized and self.lora_step_cutoff is None:
+            self.pipeline.fuse_lora(adapter_names=adapter_names, lora_scale=1.0)
+            self._lora_fused = True
+        self._active_lora_weights = requested
+
+    def _encode_prompt_cached(self, text: str):
+        """Text-encoder output for text, reused across generate() calls."""
+        embeds = self._prompt_embeds.get(text)
+        if embeds is not None:
+            self._prompt_embeds.move_to_end(text)
+            return embeds
+
+        if isinstance(self.pipeline, (ZImageImg2ImgPipeline, ZImagePipeline)):
+            embeds, _ = self.pipeline.encode_prompt(prompt=text,
+                                                    device=self.pipeline.device,
+                                                    do_classifier_free_guidance=False)
+        else:
+            # Stable Diffusion repeats provided embeddings per image itself
+            embeds, _ = self.pipeline.encode_prompt(prompt=text,
+                                                    device=self.pipeline.device,
+                                                    num_images_per_prompt=1,
+                                                    do_classifier_free_guidance=False)
+        self._prompt_embeds[text] = embeds
+        while len(self._prompt_embeds) > PROMPT_EMBEDS_CACHE_SIZE:
+            self._prompt_embeds.popitem(last=False)
+        return embeds
+
+    def _prompt_kwargs(self, prompt: Union[str, List[str]], negative_prompt: str, guidance_scale: float) -> dict:
+        """Pipeline prompt arguments with pre-computed embeddings in place of the raw strings."""
+        prompts = [prompt] if isinstance(prompt, str) else prompt
+        kwargs = {"prompt_embeds": self._join_embeds([self._encode_prompt_cached(p) for p in prompts])}
+        if guidance_scale > 1:
+            negative = self._encode_prompt_cached(negative_prompt)
+            kwargs["negative_prompt_embeds"] = self._join_embeds([negative] * len(prompts))
+        return kwargs
+
+    @staticmethod
+    def _join_embeds(embeds: list):
+        """Batch per-prompt embeddings: ZImage takes a list of tensors, Stable Diffusion one stacked tensor."""
+        if len(embeds) == 1:
+            return embeds[0]
+        if isinstance(embeds[0], list):
+            return [tensor for prompt_embeds in embeds for tensor in prompt_embeds]
+        return torch.cat(embeds)
+
+    def _companion_pipeline(self, pipeline_class):
+        """Pipeline of another type over the loaded components, built once and reused."""
+        if type(self._companion) is not pipeline_class:
+            self._companion = pipeline_class(**self.pipeline.components)
+        return self._companion
+
+    def _prompt_vector(self, prompt_embeds) -> torch.Tensor:
+        """Mean-pooled, normalised prompt embedding used to find near-duplicate prompts."""
+        return torch.nn.functional.normalize(prompt_embeds[0].float().mean(dim=0), dim=0)
+
+    def _approx_cache_lookup(self, prompt: str, prompt_embeds, height: int, width: int) -> Optional[Image.Image]:
+        """Most similar earlier txt2img result of the same size, if it clears the threshold."""
+        if self.approx_cache_threshold is None or self._active_loras or not self._approx_cache:
+            return None
+
+        query = self._prompt_vector(prompt_embeds)
+        best_similarity, best_image = 0.0, None
+        for cached_prompt, (vector, image) in self._approx_cache.items():
+            # Re-running the exact prompt asks for a new variation, not a refinement
+            if cached_prompt == prompt or image.size != (width, height):
+                continue
+            similarity = float(torch.dot(query, vector))
+            if similarity > best_similarity:
+                best_similarity, best_image = similarity, image
+
+        if best_similarity < self.approx_cache_threshold:
+            return None
+        logger.info(f"Approximate cache hit (similarity {best_similarity:.3f}), starting from a cached image")
+        return best_image
+
+    def _approx_cache_store(self, prompt: str, prompt_embeds, image: Image.Image) -> None:
+        # Adapters change what a prompt renders to, so results with LoRAs are not reused
+        if self.approx_cache_threshold is None or self._active_loras:
+            return
+        self._approx_cache[prompt] = (self._prompt_vector(prompt_embeds), image)
+        self._approx_cache.move_to_end(prompt)
+        while len(self._approx_cache) > APPROX_CACHE_SIZE:
+            self._approx_cache.popitem(last=False)
+
+    def _load_reference_image(self, image_path: str) -> torch.Tensor:
+        """
+        Load a reference image as a [1, 3, H, W] float tensor in [0, 1] on the pipeline device.
+
+        Decoding stays on the CPU (Pillow, or Pillow-SIMD/libjpeg-turbo when installed in
+        its place); the resize runs on the GPU and the img2img pipelines take the tensor as is.
+        """
         try:
-            img = Image.open(image_path).convert('RGB')
+            img = Image.open(image_path)
+            # JPEGs can be decoded at a reduced scale when they are much larger than the target
+            img.draft('RGB', (720, 720))
+            img.load()
+            if img.mode != 'RGB':
+                img = img.convert('RGB')
             # logger.info(f"Loaded reference image: {image_path}")
 
-            # resize to 720p without changing aspect ratio
+            # resize to 720p without changing aspect ratio, rounded down to a multiple of 16
             width, height = img.size
-            img = img.resize((720, int(720 * height / width)))
-            # resize to multiple of 16
-            width, height = img.size
-            new_width = width - (width % 16)
-            new_height = height - (height % 16)
-            if new_width != width or new_height != height:
+            new_width = 720
+            new_height = int(720 * height / width)
+            new_height -= new_height % 16
+            if self.compile_model:
+                # Snap to a fixed set of shapes so compiled graphs are reused across uploads
+                new_height = min(REFERENCE_HEIGHTS, key=lambda h: abs(h - new_height))
+
+            # Upload as uint8 (a quarter of the float bytes) and convert on the device
+            pixels = torch.from_numpy(np.asarray(img))
+            if self.pipeline.device.type == 'cuda':
+                pixels = pixels.pin_memory()
+            pixels = pixels.to(self.pipeline.device, non_blocking=True)
+            pixels = pixels.permute(2, 0, 1).unsqueeze(0).float().div_(255)
+            if (new_width, new_height) != (width, height):
                 logger.info(f"Resizing image from {width}x{height} to {new_width}x{new_height}")
-                img = img.resize((new_width, new_height))
+                # antialias keeps downscales from aliasing the way a plain bilinear tap would
+                pixels = F.interpolate(pixels, size=(new_height, new_width), mode='bilinear',
+                                       align_corners=False, antialias=True).clamp_(0, 1)
 
-            return img
+            return pixels
         except Exception as e:
             logger.error(f"Error loading reference image: {e}")
             raise e
 
+    def _lora_gate(self, num_inference_steps: int, callback=None):
+        """Step-end callback that disables the LoRAs once lora_step_cutoff of the steps have run."""
+        # Subject LoRAs shape the composition in the early, high-noise steps; later steps mostly
+        # refine detail, so dropping the adapters there saves their matmuls at little cost
+        cutoff_step = max(1, round(self.lora_step_cutoff * num_inference_steps))
+
+        def gate(pipe, step, timestep, callback_kwargs):
+            if step + 1 == cutoff_step:
+                pipe.disable_lora()
+            return callback(pipe, step, timestep, callback_kwargs) if callback else callback_kwargs
+
+        return gate
+
+    @staticmethod
+    def _to_pil(images: torch.Tensor) -> List[Image.Image]:
+        """Quantize a [N, 3, H, W] batch in [0, 1] to uint8 on its device, then copy to host as PIL images."""
+        # Casting before the transfer keeps the device-to-host copy at one byte per channel
+        pixels = images.clamp(0, 1).mul_(255).round_().to(torch.uint8).permute(0, 2, 3, 1).contiguous()
+        return [Image.fromarray(array) for array in pixels.cpu().numpy()]
+
+    def _attention_backends(self):
+        """sdpa_kernel context preferring the fused backends (no-op off CUDA or on older torch)."""
+        if self.pipeline.device.type != 'cuda' or not _SDPA_SET_PRIORITY:
+            return nullcontext()
+        return sdpa_kernel(SDPA_BACKENDS, set_priority=True)
+
     def generate(self,
                  prompt: str,
                  ref_image_path: Optional[str] = None,
@@ -241,15 +813,41 @@ class ImageGenerator:
                  seed: Optional[int] = None,
                  height: int = 720,
                  width: int = 720,
-                 callback = None):
+                 callback = None) -> Image.Image:
+        """Generate a single image; see generate_images for the arguments."""
+        return self.generate_images(prompt,
+                                    ref_image_path=ref_image_path,
+                                    negative_prompt=negative_prompt,
+                                    num_inference_steps=num_inference_steps,
+                                    guidance_scale=guidance_scale,
+                                    strength=strength,
+                                    seed=seed,
+                                    height=height,
+                                    width=width,
+                                    num_images_per_prompt=1,
+                                    callback=callback)[0]
+
+    def generate_images(self,
+                        prompt: Union[str, List[str]],
+                        ref_image_path: Optional[str] = None,
+                        negative_prompt: str = "",
+                        num_inference_steps: int = 10,
+                        guidance_scale: float = 0,
+                        strength: float = 0.8,
+                        seed: Optional[int] = None,
+                        height: int = 720,
+                        width: int = 720,
+                        num_images_per_prompt: int = 1,
+                        callback = None) -> List[Image.Image]:
         """
         Generate edited images based on reference image and text prompt.
 
         Args:
             ref_image_path: Path to the reference/input image
-            prompt: Text prompt for editing guidance
+            prompt: Text prompt for editing guidance, or a list of prompts denoised as one batch
             negative_prompt: Text prompt for what to avoid
-            number_of_images: Number of variations to generate
+            num_images_per_prompt: Number of variations, denoised together as one batch
+                                   (latent memory grows linearly with it)
             num_inference_steps: Number of diffusion steps
             guidance_scale: How much to follow the prompt
             strength: How much to modify the original image (0.0-1.0)
@@ -262,82 +860,115 @@ class ImageGenerator:
             if self.pipeline is None:
                 raise ValueError("Model pipeline is not loaded.")
 
-            generator = None
-            if seed is not None:
-                generator = torch.Generator(device=self.pipeline.device).manual_seed(seed)
+            # Always seed explicitly so every image can be reproduced from the logged seed
+            if seed is None:
+                seed = int(time.time() * 1000) % 2**32
+            generator = self._rng.manual_seed(seed)
+            self.last_seed = seed
+            logger.info(f"Generating with seed {seed}")
+
+            if self.lora_step_cutoff is not None and self._active_loras:
+                # The previous generation may have switched the adapters off at its cutoff step
+                self.pipeline.enable_lora()
+                callback = self._lora_gate(num_inference_steps, callback)
 
             # Load reference image if provided
             if ref_image_path and path.exists(ref_image_path):
                 reference_img = self._load_reference_image(ref_image_path)
-                height = reference_img.height
-                width = reference_img.width
+                height, width = reference_img.shape[-2:]
                 
-                with torch.no_grad():
+                with torch.inference_mode(), self._attention_backends():
                     # Check the actual pipeline type to determine which inference path to use
                     if isinstance(self.pipeline, (ZImageImg2ImgPipeline, ZImagePipeline)):
                         # ZImage model (directory-based or checkpoint-based)
                         result = self.pipeline(
-                            prompt=prompt,
+                            **self._prompt_kwargs(prompt, negative_prompt, guidance_scale),
                             image=reference_img,
-                            negative_prompt=negative_prompt,
                             num_inference_steps=num_inference_steps,
                             guidance_scale=guidance_scale,
-                            num_images_per_prompt=1,
+                            num_images_per_prompt=num_images_per_prompt,
                             strength=strength,
                             height=height,
                             width=width,
                             generator=generator,
-                            callback_on_step_end=callback
+                            callback_on_step_end=callback,
+                            output_type="pt"
                         )
                     else:
                         # StableDiffusion model (img2img)
-                        img2img_pipe = StableDiffusionImg2ImgPipeline(**self.pipeline.components)
-                        result = img2img_pipe(
-                            prompt=prompt,
+                        result = self._companion_pipeline(StableDiffusionImg2ImgPipeline)(
+                            **self._prompt_kwargs(prompt, negative_prompt, guidance_scale),
                             image=reference_img,
-                            negative_prompt=negative_prompt,
                             num_inference_steps=num_inference_steps,
                             guidance_scale=guidance_scale,
-                            num_images_per_prompt=1,
+                            num_images_per_prompt=num_images_per_prompt,
                             strength=strength,
                             generator=generator,
-                            callback_on_step_end=callback
+                            callback_on_step_end=callback,
+                            output_type="pt"
                         )
             else:
                 # Text-to-Image (no reference image provided)
                 # logger.info("No reference image provided. Switching to Text-to-Image mode.")
                 
-                with torch.no_grad():
+                with torch.inference_mode(), self._attention_backends():
                     # Check the actual pipeline type to determine which inference path to use
                     if isinstance(self.pipeline, (ZImageImg2ImgPipeline, ZImagePipeline)):
                         # ZImage model (directory-based or checkpoint-based)
-                        txt2img_pipe = ZImagePipeline(**self.pipeline.components)
-                        result = txt2img_pipe(
-                            prompt=prompt,
-                            negative_prompt=negative_prompt,
-                            num_inference_steps=num_inference_steps,
-                            guidance_scale=guidance_scale,
-                            num_images_per_prompt=1,
-                            height=height,
-                            width=width,
-                            generator=generator,
-                            callback_on_step_end=callback
-                        )
+                        prompt_kwargs = self._prompt_kwargs(prompt, negative_prompt, guidance_scale)
+                        cached_img = None
+                        single = isinstance(prompt, str) and num_images_per_prompt == 1
+                        if single:
+                            cached_img = self._approx_cache_lookup(prompt, prompt_kwargs["prompt_embeds"], height, width)
+
+                        if cached_img is not None:
+                            # An edited version of this prompt was rendered before: re-noise that
+                            # image part way and denoise only the remaining steps
+                            result = self.pipeline(
+                                **prompt_kwargs,
+                                image=cached_img,
+                                num_inference_steps=num_inference_steps,
+                                guidance_scale=guidance_scale,
+                                num_images_per_prompt=1,
+                                strength=APPROX_CACHE_STRENGTH,
+                                height=height,
+                                width=width,
+                                generator=generator,
+                                callback_on_step_end=callback,
+                                output_type="pt"
+                            )
+                        else:
+                            result = self._companion_pipeline(ZImagePipeline)(
+                                **prompt_kwargs,
+                                num_inference_steps=num_inference_steps,
+                                guidance_scale=guidance_scale,
+                                num_images_per_prompt=num_images_per_prompt,
+                                height=height,
+                                width=width,
+                                generator=generator,
+                                callback_on_step_end=callback,
+                                output_type="pt"
+                            )
+
+                        if single:
+                            images = self._to_pil(result.images)
+                            self._approx_cache_store(prompt, prompt_kwargs["prompt_embeds"], images[0])
+                            return images
                     else:
                         # StableDiffusion model (txt2img)
                         result = self.pipeline(
-                            prompt=prompt,
-                            negative_prompt=negative_prompt,
+                            **self._prompt_kwargs(prompt, negative_prompt, guidance_scale),
                             num_inference_steps=num_inference_steps,
                             guidance_scale=guidance_scale,
-                            num_images_per_prompt=1,
+                            num_images_per_prompt=num_images_per_prompt,
                             height=height,
                             width=width,
                             generator=generator,
-                            callback_on_step_end=callback
+                            callback_on_step_end=callback,
+                            output_type="pt"
                         )
 
-            return result.images[0]
+            return self._to_pil(result.images)
 
         except Exception as e:
             logger.error(f"Inference error: {e}")
@@ -346,8 +977,7 @@ class ImageGenerator:
     def generate_from_yaml(self, yaml_path: str) -> bool:
         """Edit images from configuration file."""
         try:
-            with open(yaml_path, 'r') as f:
-                config = yf.safe_load(f)
+            config = load_yaml_config(yaml_path)
 
             seed = config.get('seed', None)
             height = config.get('height', 720)
@@ -372,10 +1002,9 @@ class ImageGenerator:
                     prompt = prompt.replace('__CHARACTER__', character)
                 #
                 character_lora_file = character.replace(" ", "")
-                char_lora_path = path.join(self.lora_path, 'characters',
-                                           f"{character_lora_file}.safetensors")
-                if path.exists(char_lora_path):
-                    lora_paths.append(char_lora_path)
+                if character_lora_file in lora_names(self.lora_path / 'characters'):
+                    lora_paths.append(path.join(self.lora_path, 'characters',
+                                                f"{character_lora_file}.safetensors"))
                     character_strength = config.get('character_strength', 0.66)
                     weights.append(character_strength)
 
@@ -385,16 +1014,15 @@ class ImageGenerator:
                     prompt = prompt.replace('__CONCEPT__', concept)
                 #
                 concept_lora_file = concept.replace(" ", "")
-                concept_lora_path = path.join(self.lora_path, 'concepts',
-                                              f"{concept_lora_file}.safetensors")
-                if path.exists(concept_lora_path):
-                    lora_paths.append(concept_lora_path)
+                if concept_lora_file in lora_names(self.lora_path / 'concepts'):
+                    lora_paths.append(path.join(self.lora_path, 'concepts',
+                                                f"{concept_lora_file}.safetensors"))
                     concept_strength = config.get('concept_strength', 0.33)
                     weights.append(concept_strength)
 
             self.load_loras(lora_paths, weights)
 
-            image = self.generate(
+            images = self.generate_images(
                 ref_image_path=ref_image_path,
                 prompt=prompt,
                 negative_prompt=negative_prompt,
@@ -403,13 +1031,13 @@ class ImageGenerator:
                 strength=ref_image_strength,
                 seed=seed,
                 height=height,
-                width=width)
+                width=width,
+                num_images_per_prompt=number_of_images)
 
-            if image:
+            for index, image in enumerate(images):
                 # Save image
-                output_path = self._get_timestamped_path(prompt)
-                image.save(output_path)
-                logger.info(f"Saved image to {output_path}")
+                output_path = self._get_timestamped_path(prompt, index if len(images) > 1 else None)
+                save_png_async(image, output_path)
 
             return True
 
@@ -417,20 +1045,60 @@ class ImageGenerator:
             logger.error(f"Error in edit_from_config: {e}")
             return False
 
-    def _get_timestamped_path(self, prompt: str) -> Path:
+    def _get_timestamped_path(self, prompt: str, index: Optional[int] = None) -> Path:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        safe_prompt = "".join(c for c in prompt[:20] if c.isalnum() or c in (' ', '_')).replace(" ", "_")
-        return self.output_dir / f"{timestamp}_{safe_prompt}.png"
+        safe_prompt = prompt[:20].translate(_SAFE_FILENAME_TABLE).replace(" ", "_")
+        suffix = f"_{index}" if index is not None else ""
+        return self.output_dir / f"{timestamp}_{safe_prompt}{suffix}.png"
+
+
+def watch_yaml(generator: ImageGenerator, yaml_path: str, debounce: float = 0.2) -> None:
+    """Run generate_from_yaml every time yaml_path is saved (needs watchdog; falls back to Enter)."""
+    try:
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+    except ImportError:
+        logger.warning("watchdog is not installed, falling back to manual triggering")
+        while True:
+            input("Press Enter\n")
+            generator.generate_from_yaml(yaml_path)
+
+    target = path.abspath(yaml_path)
+    changed = threading.Event()
+
+    class _Handler(FileSystemEventHandler):
+        # Only writes count: open/close-without-write events (watchdog >= 2.3 on Linux) fire on
+        # every read, including generate_from_yaml's own, and would trigger extra generations
+        def _check(self, event):
+            # Editors often save by writing a temp file and renaming it over the original
+            paths = (getattr(event, 'src_path', ''), getattr(event, 'dest_path', ''))
+            if not event.is_directory and target in map(path.abspath, filter(None, paths)):
+                changed.set()
+
+        on_modified = on_created = on_moved = on_closed = _check
+
+    observer = Observer()
+    observer.schedule(_Handler(), path.dirname(target))
+    observer.start()
+    logger.info(f"Watching {target} for changes (Ctrl-C to stop)")
+    try:
+        while True:
+            changed.wait()
+            # Coalesce the burst of events a single save produces
+            time.sleep(debounce)
+            changed.clear()
+            generator.generate_from_yaml(yaml_path)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        observer.stop()
+        observer.join()
 
 
 if __name__ == "__main__":
+    from torch_config import configure_cuda_math
+    configure_cuda_math()
+
     generator = ImageGenerator()
     generator.load_model()
-
-    while True:
-        try:
-            input("Press Enter\n")
-            generator.generate_from_yaml("/root/.imgenie/prompts/prompt.yaml")
-        except Exception as e:
-            logger.error(f"Error: {e}")
-            raise e
+    watch_yaml(generator, "/root/.imgenie/prompts/prompt.yaml")
@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+
+import atexit
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# PNG encoding happens off the generation thread. One pool serves every generator and upscaler
+# in the process (models are created and evicted repeatedly); pending saves drain on exit
+_save_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='imgenie-save')
+atexit.register(_save_pool.shutdown, wait=True)
+
+
+def save_png_async(image, output_path, description: str = "image") -> None:
+    """Write a PIL image as a fast-deflate (level 1) PNG on the shared save pool."""
+    def _done(future):
+        if future.exception() is not None:
+            logger.error(f"Error saving {description} to {output_path}: {future.exception()}")
+        else:
+            logger.info(f"Saved {description} to {output_path}")
+
+    _save_pool.submit(image.save, output_path, optimize=False, compress_level=1).add_done_callback(_done)
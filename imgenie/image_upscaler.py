@@ -10,6 +10,12 @@ import torch
 from PIL import Image
 from diffusers import StableDiffusionUpscalePipeline
 
+# Run as a script or imported as part of the imgenie package
+try:
+    from image_io import save_png_async
+except ImportError:
+    from imgenie.image_io import save_png_async
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -100,7 +106,7 @@ class ImageUpscalerSD:
             
         logger.info(f"Using prompt: '{prompt}'")
 
-        with torch.no_grad():
+        with torch.inference_mode():
             upscaled_image = self.pipeline(
                 prompt=prompt,
                 negative_prompt=negative_prompt,
@@ -126,12 +132,14 @@ class ImageUpscalerSD:
     def save_image(self, image: Image.Image, prefix: str = "upscale_sd") -> str:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         output_path = self.output_dir / f"{timestamp}_{prefix}.png"
-        image.save(output_path)
-        logger.info(f"Saved SD upscaled image to {output_path}")
+        # 4x outputs are large PNGs; encode them without holding up the caller
+        save_png_async(image, output_path, "SD upscaled image")
         return str(output_path)
 
 if __name__ == "__main__":
     import sys
+    from torch_config import configure_cuda_math
+    configure_cuda_math()
     if len(sys.argv) > 1:
         image_path = sys.argv[1]
         
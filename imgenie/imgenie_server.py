@@ -5,27 +5,78 @@ IMGENIE Web UI Server - Simple Flask wrapper
 """
 
 import os
+import gc
 import sys
-import base64
+import copy
+import hashlib
 import io
+import json
 import yaml
 import time
+import uuid
 import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional, Dict, Union, List
 
 from flask import Flask, jsonify, request, send_from_directory
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 
-from PIL import Image
+# Must be set before torch initialises CUDA. Expandable segments let the caching allocator
+# grow and release mappings in place, so alternating loads of differently sized models
+# don't fragment VRAM into blocks too small for the next model's weights
+os.environ.setdefault('PYTORCH_CUDA_ALLOC_CONF', 'expandable_segments:True')
 
+from filename_table import FilenameTable
 from image_describer import ImageDescriber
-from image_generator import ImageGenerator
+from image_generator import ImageGenerator, load_yaml_config, lora_names
+from model_cache import ModelCache
+from request_batcher import RequestBatcher
+from torch_config import configure_cuda_math
+
+# Rust JSON encoder for API responses; the stdlib one is used when it isn't installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # ========================
 # CONFIG & STATE
 # ========================
 
+# Generated images kept in memory for saving when recent_images_limit isn't configured
+RECENT_IMAGES_LIMIT = 8
+DEFAULT_RESOLUTIONS = ['720x720', '1024x1024']
+# Seconds browsers may reuse config responses before revalidating them with their ETag
+CONFIG_MAX_AGE = 5
+# Request threads for the waitress server; GPU work still funnels through COMPUTE_POOL
+WSGI_THREADS = 8
+# How often (seconds) the idle-model reaper looks for models past model_ttl_seconds
+IDLE_CHECK_INTERVAL = 5
+
+# Maps every non-alphanumeric character to "_" for generated image ids
+_FILENAME_TABLE = FilenameTable('_')
+
+# Flask serves each request on its own thread; all GPU work (load, unload, LoRA swaps,
+# inference) goes through this single worker so concurrent requests queue instead of
+# interleaving on the device
+COMPUTE_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix='imgenie-compute')
+
+
+def run_on_gpu(fn, *args, **kwargs):
+    """Run fn on the compute worker and wait for its result."""
+    return COMPUTE_POOL.submit(fn, *args, **kwargs).result()
+
+
+def json_body(value) -> tuple:
+    """Serialise value to JSON bytes, paired with a content hash to use as its ETag."""
+    body = orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS) if orjson else json.dumps(value).encode()
+    return body, hashlib.blake2b(body, digest_size=8).hexdigest()
+
+
 class ImgenieServer:
     """Manage model loading and generation"""
     
@@ -40,31 +91,299 @@ class ImgenieServer:
         # Load model configs
         self.t2i_cfg = self.config.get('txt2img', {})
         self.i2t_cfg = self.config.get('img2txt', {})
+
+        # Config-derived API responses never change while the server runs; serialise them once
+        self.payloads = self._build_payloads()
+        # After serialising, so the resolved paths stay out of /api/app-config
+        self._resolve_paths()
         
         # Current loaded models
         self.t2i_model: Optional[ImageGenerator] = None
         self.i2t_model: Optional[ImageDescriber] = None
         self.current_t2i_id: Optional[str] = None
         self.current_i2t_id: Optional[str] = None
+        # Models unloaded after sitting idle; they are reloaded by the next request that needs them
+        self.idle_t2i_id: Optional[str] = None
+        self.idle_i2t_id: Optional[str] = None
+        self.model_ttl: Optional[float] = self.config.get('model_ttl_seconds')
+        if self.model_ttl is not None and not self.model_ttl > 0:
+            print(f"Ignoring model_ttl_seconds={self.model_ttl}; it must be greater than 0")
+            self.model_ttl = None
+
+        # Loaded models kept resident per task; switching back to a cached model skips the reload
+        max_resident = self.config.get('max_resident_models', 1)
+        # Evicted text-to-image models can wait in host RAM instead of being dropped
+        ram_cache_gb = self.config.get('ram_cache_gb') or 0
+        self.t2i_cache = ModelCache(max_resident=max_resident,
+                                    max_parked=self.config.get('max_parked_models', 0),
+                                    max_parked_bytes=int(ram_cache_gb * 2**30))
+        self.i2t_cache = ModelCache(max_resident=max_resident)
+
+        # Concurrent describe requests are captioned together in one generate() call
+        self.describe_batcher = RequestBatcher(
+            lambda model, imgs: run_on_gpu(model.describe_batch, imgs),
+            max_batch=self.config.get('describe_max_batch', 4),
+            max_wait_ms=self.config.get('describe_max_wait_ms', 20))
+
+        # Unseeded txt2img requests with the same model, settings and LoRAs share one pipeline call
+        self.generate_batcher = RequestBatcher(
+            lambda key, requests: run_on_gpu(self._generate_batch, key, requests),
+            max_batch=self.config.get('generate_max_batch', 4),
+            max_wait_ms=self.config.get('generate_max_wait_ms', 50))
+
+        # PNG bytes of recent generations, written to disk only when the user saves one
+        self.recent_images: "OrderedDict[str, tuple]" = OrderedDict()  # image id -> (file name, PNG bytes)
+        self.recent_images_limit = max(1, int(self.config.get('recent_images_limit', RECENT_IMAGES_LIMIT)))
+
+    def _resolve_paths(self) -> None:
+        """Resolve each model's paths against root_dir once, stored as _resolved_* keys on its config."""
+        root_dir = self.config.get('root_dir')
+        for model_id, cfg in self.t2i_cfg.items():
+            if not isinstance(cfg, dict):
+                continue
+            cfg['_resolved_model_path'] = resolve_path(cfg.get('model_path', model_id), root_dir, True)
+            cfg['_resolved_lora_path'] = resolve_path(cfg.get('lora_path', str(self.lora_path)), root_dir)
+            for key in ('character_lora_path', 'concept_lora_path', 'prompts_db_path'):
+                cfg[f'_resolved_{key}'] = resolve_path(cfg.get(key), root_dir)
+        for model_id, cfg in self.i2t_cfg.items():
+            if isinstance(cfg, dict):
+                cfg['_resolved_model_path'] = resolve_path(cfg.get('model_path', model_id), root_dir, True)
+
+    def build_t2i_model(self, model_id: str) -> Optional[ImageGenerator]:
+        """Create and load a text-to-image model; None if loading failed."""
+        model_config = self.t2i_cfg[model_id]
+        model = ImageGenerator(
+            model_path=model_config['_resolved_model_path'],
+            input_dir=str(self.input_folder),
+            output_dir=str(self.output_folder),
+            # Model-specific lora path if defined, else global
+            lora_path=model_config['_resolved_lora_path'],
+            # Base model path for UNet-only checkpoints
+            base_model_path=model_config.get('base_model_path', None),
+            deepcache_interval=model_config.get('deepcache_interval'),
+            compile_model=model_config.get('compile', False),
+            vae_tiling=model_config.get('vae_tiling', False),
+            approx_cache_threshold=model_config.get('approx_cache_threshold'),
+            quantization=model_config.get('quantization'),
+            lora_step_cutoff=model_config.get('lora_step_cutoff')
+        )
+        return model if model.load_model() else None
+
+    def build_i2t_model(self, model_id: str) -> Optional[ImageDescriber]:
+        """Create and load an image-to-text model; None if loading failed."""
+        model_config = self.i2t_cfg[model_id]
+        model = ImageDescriber(
+            model_path=model_config['_resolved_model_path'],
+            input_dir=str(self.input_folder),
+            output_dir=str(self.output_folder),
+            quantization=model_config.get('quantization'),
+            backend=model_config.get('backend', 'transformers'),
+            gpu_memory_utilization=model_config.get('gpu_memory_utilization', 0.9),
+            gpu_decode=model_config.get('gpu_decode', False)
+        )
+        return model if model.load_model() else None
+
+    def warmup(self) -> None:
+        """Initialise CUDA and optionally preload a model so the first Load is a cache hit."""
+        try:
+            if torch.cuda.is_available():
+                torch.cuda.init()
+            preload = self.config.get('preload_model')
+            if preload is True:
+                preload = next(iter(self.t2i_cfg), None)
+            if preload in self.t2i_cfg:
+                print(f"Preloading model: {preload}")
+                run_on_gpu(self.t2i_cache.get_or_load, preload, lambda: self.build_t2i_model(preload))
+        except Exception as e:
+            print(f"Warmup failed: {e}")
+
+    def _generate_batch(self, key: tuple, requests: list) -> list:
+        """Generate one image per queued (prompt, callback) request; returns (image, seed) pairs."""
+        model, steps, guidance_scale, height, width, loras = key
+        model.load_loras([p for p, _ in loras], [w for _, w in loras])
+        prompts = [prompt for prompt, _ in requests]
+        images = model.generate_images(
+            prompts[0] if len(prompts) == 1 else prompts,
+            num_inference_steps=steps,
+            guidance_scale=guidance_scale,
+            height=height,
+            width=width,
+            callback=requests[0][1])
+        # The whole batch is drawn from one seed, which only reproduces an image generated alone
+        seed = model.last_seed if len(requests) == 1 else None
+        return [(image, seed) for image in images]
+
+    def _generate_single(self, model: ImageGenerator, lora_paths: list, lora_weights: list, **kwargs):
+        """
+        Apply a request's LoRAs and generate in one compute job, so no other request's adapters
+        land in between. Returns (image, seed), the seed read before the next job can replace it.
+        """
+        try:
+            model.load_loras(lora_paths, lora_weights)
+        except Exception as e:
+            print(f"Error loading LoRAs: {e}")
+            import traceback
+            traceback.print_exc()
+        image = model.generate(**kwargs)
+        return image, model.last_seed
+
+    def _build_payloads(self) -> Dict[str, tuple]:
+        """Pre-serialised (JSON, ETag) pairs for the config endpoints, keyed by route (and task / model id)."""
+        tasks = {'text-to-image': self.t2i_cfg, 'image-to-text': self.i2t_cfg}
+        payloads = {
+            'app-config': {
+                'txt2img': self.t2i_cfg,
+                'img2txt': self.i2t_cfg,
+                'save_metadata': self.config.get('save_metadata', True)
+            }
+        }
+        for task, cfgs in tasks.items():
+            payloads[f'models:{task}'] = [{
+                'id': model_id,
+                'name': cfg.get('name', model_id),
+                'description': cfg.get('description', ''),
+                'model_path': cfg.get('model_path', '')
+            } for model_id, cfg in cfgs.items() if isinstance(cfg, dict)]
+            for model_id, cfg in cfgs.items():
+                payloads[f'resolutions:{task}:{model_id}'] = {
+                    'model_id': model_id,
+                    'task': task,
+                    'resolutions': cfg.get('resolution_options', DEFAULT_RESOLUTIONS)
+                    if isinstance(cfg, dict) else DEFAULT_RESOLUTIONS
+                }
+        return {key: json_body(value) for key, value in payloads.items()}
+
+    def active_t2i_model(self) -> Optional[ImageGenerator]:
+        """Selected text-to-image model, reloaded if it was unloaded for being idle."""
+        if self.t2i_model is None and self.idle_t2i_id is not None:
+            model_id = self.idle_t2i_id
+            print(f"Reloading idle model: {model_id}")
+            self.t2i_model = run_on_gpu(self.t2i_cache.get_or_load, model_id,
+                                        lambda: self.build_t2i_model(model_id))
+            if self.t2i_model is not None:
+                self.current_t2i_id, self.idle_t2i_id = model_id, None
+        elif self.current_t2i_id is not None:
+            self.t2i_cache.get(self.current_t2i_id)  # marks it as used
+        return self.t2i_model
+
+    def active_i2t_model(self) -> Optional[ImageDescriber]:
+        """Selected image-to-text model, reloaded if it was unloaded for being idle."""
+        if self.i2t_model is None and self.idle_i2t_id is not None:
+            model_id = self.idle_i2t_id
+            print(f"Reloading idle model: {model_id}")
+            self.i2t_model = run_on_gpu(self.i2t_cache.get_or_load, model_id,
+                                        lambda: self.build_i2t_model(model_id))
+            if self.i2t_model is not None:
+                self.current_i2t_id, self.idle_i2t_id = model_id, None
+        elif self.current_i2t_id is not None:
+            self.i2t_cache.get(self.current_i2t_id)
+        return self.i2t_model
+
+    def reap_idle_models(self) -> None:
+        """Background loop unloading models that have gone unused for model_ttl seconds."""
+        while True:
+            time.sleep(IDLE_CHECK_INTERVAL)
+            if not self.model_ttl:
+                continue
+            try:
+                run_on_gpu(self._evict_idle_models)
+            except Exception as e:
+                print(f"Idle model check failed: {e}")
+
+    def _evict_idle_models(self) -> None:
+        evicted = False
+        for model_id in self.t2i_cache.evict_idle(self.model_ttl):
+            evicted = True
+            if model_id == self.current_t2i_id:
+                self.t2i_model, self.current_t2i_id, self.idle_t2i_id = None, None, model_id
+        for model_id in self.i2t_cache.evict_idle(self.model_ttl):
+            evicted = True
+            if model_id == self.current_i2t_id:
+                self.i2t_model, self.current_i2t_id, self.idle_i2t_id = None, None, model_id
+        if evicted and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def drop_evicted_selection(self) -> None:
+        """Forget the selected models if they are no longer resident, e.g. evicted by a load that then failed."""
+        if self.current_t2i_id is not None and self.current_t2i_id not in self.t2i_cache:
+            self.t2i_model = self.current_t2i_id = None
+        if self.current_i2t_id is not None and self.current_i2t_id not in self.i2t_cache:
+            self.i2t_model = self.current_i2t_id = None
+
+    def hard_unload(self, task: str) -> None:
+        """Unload the task's current model (or park it, if enabled) and hand freed VRAM back to the driver."""
+        if task == 'text-to-image':
+            model_id, cache = self.current_t2i_id, self.t2i_cache
+            self.t2i_model = self.current_t2i_id = self.idle_t2i_id = None
+        else:
+            model_id, cache = self.current_i2t_id, self.i2t_cache
+            self.i2t_model = self.current_i2t_id = self.idle_i2t_id = None
+        if model_id is not None:
+            cache.evict(model_id)
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+            torch.cuda.ipc_collect()
+
+    def remember_image(self, filename: str, png_bytes: bytes) -> str:
+        """Keep a generated PNG under a new unique id (returned); filename is used if it is saved."""
+        image_id = uuid.uuid4().hex
+        self.recent_images[image_id] = (filename, png_bytes)
+        while len(self.recent_images) > self.recent_images_limit:
+            self.recent_images.popitem(last=False)
+        return image_id
 
     def _load_config(self) -> dict:
         if not self.config_path.exists():
             print(f"Config file not found: {self.config_path}")
             return {}
         try:
-            with open(self.config_path, 'r') as f:
-                return yaml.safe_load(f) or {}
+            # Shares the generator's mtime-keyed YAML cache with the prompt files. The cached mapping
+            # is read-only and shared, so the server works on its own copy (_resolve_paths annotates it)
+            return copy.deepcopy(dict(load_yaml_config(str(self.config_path))))
         except Exception as e:
             print(f"Error loading config: {e}")
             return {}
 
 server: Optional['ImgenieServer'] = None
 
+
+@lru_cache(maxsize=None)
+def resolve_path(path_str: Optional[str], root_dir: Optional[str], only_if_exists: bool = False) -> Optional[str]:
+    """
+    path_str joined onto root_dir when it is relative and a root is configured. With
+    only_if_exists, the joined path is used only if it exists (model ids may be hub names).
+    """
+    if not path_str or not root_dir or os.path.isabs(path_str):
+        return path_str
+    joined = os.path.join(root_dir, path_str)
+    if only_if_exists and not os.path.exists(joined):
+        return path_str
+    return joined
+
+
 # ========================
 # SETUP FLASK
 # ========================
 
+class OrjsonProvider(DefaultJSONProvider):
+    """jsonify() through orjson, writing the response body as bytes without a str round trip."""
+
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
 app = Flask(__name__, static_folder='ui', static_url_path='/ui')
+if orjson:
+    app.json = OrjsonProvider(app)
 CORS(app)
 
 UI_DIR = Path(__file__).parent / 'ui'
@@ -80,32 +399,67 @@ def allowed_file(filename):
 # UI ROUTES
 # ========================
 
+# Scripts and styles may be cached for a day: index.html links them with a ?v=<mtime>
+# query, so an edited file gets a new URL. index.html itself is always revalidated
+# (cheap 304s via its ETag).
+UI_ASSET_MAX_AGE = 86400
+
+
+@lru_cache(maxsize=4)
+def _versioned_index(index_mtime_ns: int, js_mtime_ns: int, css_mtime_ns: int) -> str:
+    html = (UI_DIR / 'index.html').read_text()
+    return (html.replace('src="app.js"', f'src="app.js?v={js_mtime_ns}"')
+                .replace('href="ui/styles.css"', f'href="ui/styles.css?v={css_mtime_ns}"'))
+
+
 @app.route('/')
 def index():
-    return send_from_directory(UI_DIR, 'index.html')
+    html = _versioned_index((UI_DIR / 'index.html').stat().st_mtime_ns,
+                            (UI_DIR / 'app.js').stat().st_mtime_ns,
+                            (UI_DIR / 'styles.css').stat().st_mtime_ns)
+    response = app.response_class(html, mimetype='text/html')
+    response.cache_control.no_cache = True
+    response.add_etag()
+    return response.make_conditional(request)
 
 @app.route('/app.js')
 def serve_app_js():
-    return send_from_directory(UI_DIR, 'app.js')
+    return send_from_directory(UI_DIR, 'app.js', max_age=UI_ASSET_MAX_AGE)
 
 @app.route('/ui/<path:path>')
 def send_ui(path):
-    return send_from_directory(UI_DIR, path)
+    return send_from_directory(UI_DIR, path, max_age=UI_ASSET_MAX_AGE)
 
 # ========================
 # API ROUTES
 # ========================
 
+def json_payload(payload: tuple, max_age: Optional[int] = CONFIG_MAX_AGE):
+    """Conditional response for a json_body() pair; a matching If-None-Match gets a bodiless 304."""
+    body, etag = payload
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.cache_control.private = True
+    if max_age is None:
+        response.cache_control.no_cache = True
+    else:
+        response.cache_control.max_age = max_age
+    return response.make_conditional(request)
+
+
+UI_CONFIG = json_body({
+    'theme_colors': {
+        'dark': {'primary': '#0a0e27', 'accent': '#ffd700', 'success': '#66ff66', 'error': '#ff6b6b'},
+        'light': {'primary': '#ffffff', 'accent': '#0052cc', 'success': '#00cc66', 'error': '#ff6b6b'}
+    },
+    'default_theme': 'dark'
+})
+
+
 @app.route('/api/config', methods=['GET'])
 def get_config():
     """Get UI configuration"""
-    return jsonify({
-        'theme_colors': {
-            'dark': {'primary': '#0a0e27', 'accent': '#ffd700', 'success': '#66ff66', 'error': '#ff6b6b'},
-            'light': {'primary': '#ffffff', 'accent': '#0052cc', 'success': '#00cc66', 'error': '#ff6b6b'}
-        },
-        'default_theme': 'dark'
-    })
+    return json_payload(UI_CONFIG)
 
 
 @app.route('/api/app-config', methods=['GET'])
@@ -114,12 +468,7 @@ def get_app_config():
     if not server:
         return jsonify({})
 
-    config = {
-        'txt2img': server.t2i_cfg,
-        'img2txt': server.i2t_cfg,
-        'save_metadata': server.config.get('save_metadata', True)
-    }
-    return jsonify(config)
+    return json_payload(server.payloads['app-config'])
 
 
 @app.route('/api/models', methods=['GET'])
@@ -130,54 +479,21 @@ def get_models():
     if not server:
         return jsonify([])
 
-    models = []
-
-    if task == 'text-to-image':
-        for model_id, cfg in server.t2i_cfg.items():
-            if isinstance(cfg, dict):
-                models.append({
-                    'id': model_id,
-                    'name': cfg.get('name', model_id),
-                    'description': cfg.get('description', ''),
-                    'model_path': cfg.get('model_path', '')
-                })
-
-    elif task == 'image-to-text':
-        for model_id, cfg in server.i2t_cfg.items():
-            if isinstance(cfg, dict):
-                models.append({
-                    'id': model_id,
-                    'name': cfg.get('name', model_id),
-                    'description': cfg.get('description', ''),
-                    'model_path': cfg.get('model_path', '')
-                })
-
-    return jsonify(models)
+    payload = server.payloads.get(f'models:{task}')
+    if payload is None:
+        return jsonify([])
+    return json_payload(payload)
 
 
 @app.route('/api/models/<model_id>/resolutions', methods=['GET'])
 def get_model_resolutions(model_id):
     """Get available resolutions for a model"""
     task = request.args.get('task', 'text-to-image')
-    resolutions = ['720x720', '1024x1024']  # Default
 
-    if not server:
-        return jsonify({'resolutions': resolutions})
-
-    try:
-        if task == 'text-to-image' and model_id in server.t2i_cfg:
-            cfg = server.t2i_cfg[model_id]
-            if isinstance(cfg, dict) and 'resolution_options' in cfg:
-                resolutions = cfg['resolution_options']
-
-        elif task == 'image-to-text' and model_id in server.i2t_cfg:
-            cfg = server.i2t_cfg[model_id]
-            if isinstance(cfg, dict) and 'resolution_options' in cfg:
-                resolutions = cfg['resolution_options']
-    except:
-        pass
-
-    return jsonify({'model_id': model_id, 'task': task, 'resolutions': resolutions})
+    payload = server.payloads.get(f'resolutions:{task}:{model_id}') if server else None
+    if payload is None:
+        return jsonify({'model_id': model_id, 'task': task, 'resolutions': DEFAULT_RESOLUTIONS})
+    return json_payload(payload)
 
 
 @app.route('/api/loras', methods=['GET'])
@@ -194,34 +510,21 @@ def get_loras():
     # Use current loaded model's config, or fallback to first available
     model_id = server.current_t2i_id
     if not model_id and server.t2i_cfg:
-        model_id = list(server.t2i_cfg.keys())[0]
+        model_id = next(iter(server.t2i_cfg))
 
     if not model_id or model_id not in server.t2i_cfg:
         return jsonify(loras)
 
     cfg = server.t2i_cfg[model_id]
-    
-    # Paths from config
-    char_path_str = cfg.get('character_lora_path')
-    concept_path_str = cfg.get('concept_lora_path')
 
-    # Helper to scan dir
+    # Helper to scan dir (paths were resolved against root_dir at startup)
     def scan_dir(path_str):
-        found = []
         if not path_str:
-            return found
-        p = Path(path_str)
-        # If relative, prepend root if exists
-        if not p.is_absolute() and server.config.get('root_dir'):
-            p = Path(server.config.get('root_dir')) / p
-            
-        if p.exists() and p.is_dir():
-            for f in p.glob('*.safetensors'):
-                found.append(f.stem)
-        return sorted(found)
+            return []
+        return sorted(lora_names(path_str))
 
-    loras['characters'] = scan_dir(char_path_str)
-    loras['concepts'] = scan_dir(concept_path_str)
+    loras['characters'] = scan_dir(cfg.get('_resolved_character_lora_path'))
+    loras['concepts'] = scan_dir(cfg.get('_resolved_concept_lora_path'))
 
     return jsonify(loras)
 
@@ -237,31 +540,22 @@ def get_prompts():
     # Use current loaded model's config, or fallback to first available
     model_id = server.current_t2i_id
     if not model_id and server.t2i_cfg:
-        model_id = list(server.t2i_cfg.keys())[0]
+        model_id = next(iter(server.t2i_cfg))
 
     if not model_id or model_id not in server.t2i_cfg:
         return jsonify({})
 
     cfg = server.t2i_cfg[model_id]
-    prompts_path_str = cfg.get('prompts_db_path')
+    prompts_path_str = cfg.get('_resolved_prompts_db_path')
 
     if not prompts_path_str:
         return jsonify({})
 
     try:
         p = Path(prompts_path_str)
-        # If relative, prepend root if exists
-        if not p.is_absolute() and server.config.get('root_dir'):
-            p = Path(server.config.get('root_dir')) / p
-
         if p.exists() and p.is_file():
-            with open(p, 'r') as f:
-                content = yaml.safe_load(f)
-                if isinstance(content, dict):
-                    return jsonify(content)
-                else:
-                    print(f"Warning: Prompts file {p} is not a valid YAML dictionary")
-                    return jsonify({})
+            # Raises for files that aren't a YAML dictionary (handled below)
+            return jsonify(dict(load_yaml_config(str(p))))
         else:
             # print(f"Prompts file not found: {p}")
             return jsonify({})
@@ -304,61 +598,26 @@ def load_model():
                 'task': task
             })
 
-        model_config = configs[model_id]
-        model_path = model_config.get('model_path', model_id)
-        
-        # Resolve model path relative to root if needed (optional logic, keeping simple for now)
-        # Assuming model_path is relative to /root/.imgenie or absolute
-        if not os.path.isabs(model_path):
-             # Try appending to root_dir if available in config
-             root_dir = server.config.get('root_dir')
-             if root_dir:
-                 potential_path = os.path.join(root_dir, model_path)
-                 if os.path.exists(potential_path):
-                     model_path = potential_path
-
-
-        # Create and load model instance
+        # Create and load model instance (or reuse it if it is still resident)
         try:
             if task == 'text-to-image':
-                # Unload previous logic not strictly needed if we just overwrite, but good practice
-                if server.t2i_model:
-                     try: server.t2i_model.unload_model()
-                     except: pass
-                
-                # Get lora path for this specific model if defined, else global
-                lora_path = model_config.get('lora_path', str(server.lora_path))
-                if not os.path.isabs(lora_path) and server.config.get('root_dir'):
-                     lora_path = os.path.join(server.config.get('root_dir'), lora_path)
-                
-                # Get base model path if specified (for UNet-only checkpoints)
-                base_model_path = model_config.get('base_model_path', None)
-                
-                server.t2i_model = ImageGenerator(
-                    model_path=model_path,
-                    input_dir=str(server.input_folder),
-                    output_dir=str(server.output_folder),
-                    lora_path=lora_path,
-                    base_model_path=base_model_path
-                )
-                if server.t2i_model.load_model():
+                model = run_on_gpu(server.t2i_cache.get_or_load, model_id,
+                                   lambda: server.build_t2i_model(model_id))
+                if model is not None:
+                    server.t2i_model = model
                     server.current_t2i_id = model_id
+                    server.idle_t2i_id = None
                     status = True
                 else:
                     status = False
                     
             else:
-                if server.i2t_model:
-                     try: server.i2t_model.unload_model() 
-                     except: pass
-
-                server.i2t_model = ImageDescriber(
-                    model_path=model_path,
-                    input_dir=str(server.input_folder),
-                    output_dir=str(server.output_folder)
-                )
-                if server.i2t_model.load_model():
+                model = run_on_gpu(server.i2t_cache.get_or_load, model_id,
+                                   lambda: server.build_i2t_model(model_id))
+                if model is not None:
+                    server.i2t_model = model
                     server.current_i2t_id = model_id
+                    server.idle_i2t_id = None
                     status = True
                 else:
                     status = False
@@ -367,12 +626,15 @@ def load_model():
             print(f"Failed to load model: {load_err}")
             import traceback
             traceback.print_exc()
+            # The previous model was evicted before the load was attempted
+            server.drop_evicted_selection()
             return jsonify({
                 'success': False,
                 'error': f'Failed to load model: {str(load_err)}'
             }), 500
 
         if not status:
+             server.drop_evicted_selection()
              return jsonify({'success': False, 'error': 'Model load returned false'}), 500
 
         return jsonify({
@@ -396,23 +658,39 @@ def unload_model():
         data = request.get_json() or {}
         task = data.get('task', 'text-to-image')
 
-        if task == 'text-to-image':
-            if server.t2i_model:
-                server.t2i_model.unload_model()
-                server.t2i_model = None
-                server.current_t2i_id = None
-        else:
-            if server.i2t_model:
-                server.i2t_model.unload_model()
-                server.i2t_model = None
-                server.current_i2t_id = None
+        # Synchronous, so the freed VRAM shows up in nvidia-smi by the time this returns
+        run_on_gpu(server.hard_unload, task)
 
         return jsonify({'success': True, 'message': 'Model unloaded'})
 
     except Exception as e:
+        print(f"Error unloading model: {e}")
+        import traceback
+        traceback.print_exc()
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@app.route('/api/model/keepalive', methods=['POST'])
+def model_keepalive():
+    """Set how long idle models stay loaded (seconds > 0; null keeps them loaded)"""
+    if not server:
+        return jsonify({'success': False, 'error': 'Server not initialized'}), 500
+    data = request.get_json() or {}
+    ttl = data.get('ttl_seconds')
+    if ttl is None:
+        server.model_ttl = None
+        return jsonify({'success': True, 'ttl_seconds': None})
+    try:
+        ttl = float(ttl)
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'ttl_seconds must be a number'}), 400
+    # A non-positive TTL would evict every model on each reaper tick
+    if not ttl > 0:
+        return jsonify({'success': False, 'error': 'ttl_seconds must be greater than 0'}), 400
+    server.model_ttl = ttl
+    return jsonify({'success': True, 'ttl_seconds': server.model_ttl})
+
+
 import torch
 
 # Global progress tracking
@@ -462,8 +740,9 @@ def model_status():
             }
     except Exception as e:
         print(f"Error getting GPU status: {e}")
-        
-    return jsonify(status)
+
+    # Polled by the UI; unchanged status is answered with a 304, but always revalidated
+    return json_payload(json_body(status), max_age=None)
 
 
 @app.route('/api/generate', methods=['POST'])
@@ -487,7 +766,7 @@ def generate():
 
         if task == 'text-to-image':
             # Text-to-image generation (or Img2Img)
-            if not server.t2i_model:
+            if not server.active_t2i_model():
                 return jsonify({'success': False, 'error': 'T2I model not loaded'}), 400
 
             prompt = data.get('prompt', '')
@@ -545,7 +824,6 @@ def generate():
             # Handle LoRAs
             loras = data.get('loras', [])
             if isinstance(loras, str):
-                import json
                 try:
                     loras = json.loads(loras)
                 except Exception as e:
@@ -553,21 +831,22 @@ def generate():
                     loras = []
             char_name = None
             concept_name = None
+            lora_paths = []
+            lora_weights = []
+            # Unseeded txt2img requests may be batched with concurrent ones (see _generate_batch)
+            batched = ref_image_path is None and seed < 0
             if server.t2i_model:
                 try:
                     # Always reset loras if none provided? 
                     # image_generator.load_loras handles empty list by unloading.
                     # So we should always call it if we want to support "no lora" when user clears selection.
-                    
-                    lora_paths = []
-                    lora_weights = []
-                    
+
                     # Get base paths from config
                     # We need the model config for paths. 
                     # server.current_t2i_id should be set if model is loaded.
                     model_cfg = server.t2i_cfg.get(server.current_t2i_id, {})
-                    char_base = model_cfg.get('character_lora_path')
-                    concept_base = model_cfg.get('concept_lora_path')
+                    char_base = model_cfg.get('_resolved_character_lora_path')
+                    concept_base = model_cfg.get('_resolved_concept_lora_path')
 
                     for lora in loras:
                         # Expected format: {'type': 'character'|'concept', 'name': 'filename', 'weight': 1.0}
@@ -582,22 +861,22 @@ def generate():
                         elif l_type == 'concept' and not concept_name:
                             concept_name = l_name
                         
-                        full_path = None
-                        if l_type == 'character' and char_base:
-                            full_path = os.path.join(char_base, f"{l_name}.safetensors")
-                        elif l_type == 'concept' and concept_base:
-                            full_path = os.path.join(concept_base, f"{l_name}.safetensors")
-                            
-                        if full_path and os.path.exists(full_path):
+                        base = None
+                        if l_type == 'character':
+                            base = char_base
+                        elif l_type == 'concept':
+                            base = concept_base
+
+                        if base and l_name in lora_names(base):
+                            full_path = os.path.join(base, f"{l_name}.safetensors")
                             lora_paths.append(full_path)
                             lora_weights.append(l_weight)
                     
-                    # Call load_loras even if empty to clear previous
+                    # Applied (even if empty, to clear previous ones) in the same compute job as the generation
                     print(f"Loading LoRAs: {lora_paths}")
-                    server.t2i_model.load_loras(lora_paths, lora_weights)
 
                 except Exception as e:
-                    print(f"Error loading LoRAs: {e}")
+                    print(f"Error resolving LoRAs: {e}")
                     import traceback
                     traceback.print_exc()
 
@@ -609,17 +888,26 @@ def generate():
 
             # Call generate
             try:
-                output_image = server.t2i_model.generate(
-                    prompt=prompt,
-                    num_inference_steps=steps,
-                    guidance_scale=guidance_scale,
-                    height=height,
-                    width=width,
-                    seed=seed if seed >= 0 else None,
-                    callback=update_progress,
-                    ref_image_path=ref_image_path,
-                    strength=strength,
-                )
+                if batched:
+                    key = (server.t2i_model, steps, guidance_scale, height, width,
+                           tuple(zip(lora_paths, lora_weights)))
+                    output_image, used_seed = server.generate_batcher.submit(key, (prompt, update_progress))
+                else:
+                    output_image, used_seed = run_on_gpu(
+                        server._generate_single,
+                        server.t2i_model,
+                        lora_paths,
+                        lora_weights,
+                        prompt=prompt,
+                        num_inference_steps=steps,
+                        guidance_scale=guidance_scale,
+                        height=height,
+                        width=width,
+                        seed=seed if seed >= 0 else None,
+                        callback=update_progress,
+                        ref_image_path=ref_image_path,
+                        strength=strength,
+                    )
 
                 # Mark as done
                 generation_progress['status'] = 'completed'
@@ -629,28 +917,29 @@ def generate():
                 if output_image:
                     # Save local copy to TEMP folder
                     timestamp = time.strftime('%Y%m%d_%H%M%S')
-                    safe_prompt = "".join([c if c.isalnum() else "_" for c in prompt])[:20]
+                    safe_prompt = prompt[:20].translate(_FILENAME_TABLE)
                     filename = f"gen_{timestamp}_{safe_prompt}.png"
-                    temp_path = os.path.join('/tmp', filename)
-                    output_image.save(temp_path)
-                    print(f"DEBUG: Saved generated image to temp: {temp_path}")
 
-                    # Encode for response
+                    # Encode the PNG once and keep it in memory until the user saves it
                     buffered = io.BytesIO()
-                    output_image.save(buffered, format="PNG")
-                    img_base64 = base64.b64encode(buffered.getvalue()).decode('utf-8')
+                    # Preview PNGs are throwaway; level 1 deflates several times faster than the default
+                    output_image.save(buffered, format="PNG", compress_level=1)
+                    png_bytes = buffered.getvalue()
+                    image_id = server.remember_image(filename, png_bytes)
 
+                    # The browser fetches the raw PNG by URL; no base64 inflation of the JSON body
                     return jsonify({
                         'success': True,
-                        'image': f'data:image/png;base64,{img_base64}',
-                        'image_id': filename,
+                        'image': f'/api/recent/{image_id}',
+                        'image_id': image_id,
+                        'filename': filename,
                         'params': {
                             'prompt': prompt, 
                             'steps': steps, 
                             'guidance_scale': guidance_scale, 
                             'resolution': f'{width}x{height}', 
                             'ref_image_strength': strength,
-                            'seed': seed,
+                            'seed': used_seed,
                             'ref_image_path': ref_image_path
                         }
                     })
@@ -667,7 +956,7 @@ def generate():
 
         elif task == 'image-to-text':
             # Image description
-            if not server.i2t_model:
+            if not server.active_i2t_model():
                 return jsonify({'success': False, 'error': 'I2T model not loaded'}), 400
 
             if 'image' not in request.files:
@@ -677,9 +966,10 @@ def generate():
             if not allowed_file(file.filename):
                 return jsonify({'success': False, 'error': 'Invalid file type'}), 400
 
-            img = Image.open(io.BytesIO(file.read())).convert('RGB')
+            # Decode straight from the upload stream instead of buffering it into bytes first
+            img = server.i2t_model.get_image_from_stream(file.stream)
             # Assuming describe returns a dict
-            result = server.i2t_model.describe(img=img)
+            result = server.describe_batcher.submit(server.i2t_model, img)
 
             if result and 'description' in result:
                 return jsonify({
@@ -714,6 +1004,11 @@ def main():
 
     import flask.cli
     flask.cli.show_server_banner = lambda *args: None
+
+    # Werkzeug speaks HTTP/1.0 by default and closes the socket after every response;
+    # HTTP/1.1 keeps connections alive across the UI's progress/status polls.
+    from werkzeug.serving import WSGIRequestHandler
+    WSGIRequestHandler.protocol_version = "HTTP/1.1"
     
     # Option A: Only show errors and warnings (Recommended)
     # This removes the "INFO" request logs but keeps critical errors
@@ -744,7 +1039,12 @@ def main():
              
         # print(f"\n📂 Initializing ImgenieServer with config: {config_path}")
 
+        configure_cuda_math()
         server = ImgenieServer(config_path=config_path)
+        # CUDA init and model preload happen off the request path
+        import threading
+        threading.Thread(target=server.warmup, daemon=True, name='imgenie-warmup').start()
+        threading.Thread(target=server.reap_idle_models, daemon=True, name='imgenie-reaper').start()
         # print(f"✓ Server initialized")
         # print(f"  Output folder: {server.output_folder}")
         # print(f"  T2I models: {list(server.t2i_cfg.keys()) if server.t2i_cfg else 'none'}")
@@ -765,9 +1065,19 @@ def main():
     print(f"  Config: {config_path}")
     print("="*70 + "\n")
 
-    # Run server
+    # Run server: waitress when installed, so status/config polls are answered by a fixed
+    # thread pool while a generation is running; the Werkzeug dev server otherwise (and with --debug)
     try:
-        app.run(host=args.host, port=args.port, debug=args.debug, use_reloader=False, threaded=True)
+        try:
+            from waitress import serve
+        except ImportError:
+            serve = None
+        if serve is None or args.debug:
+            if serve is None:
+                print("waitress not installed, using the Flask development server")
+            app.run(host=args.host, port=args.port, debug=args.debug, use_reloader=False, threaded=True)
+        else:
+            serve(app, host=args.host, port=args.port, threads=WSGI_THREADS, ident='imgenie')
     except KeyboardInterrupt:
         print("\n⏹️  Shutting down...")
         sys.exit(0)
@@ -787,17 +1097,16 @@ def save_image():
     if not image_id:
         return jsonify({'success': False, 'error': 'Image ID required'}), 400
         
-    temp_path = os.path.join('/tmp', image_id)
-    if not os.path.exists(temp_path):
+    recent = server.recent_images.get(image_id)
+    if recent is None:
         return jsonify({'success': False, 'error': 'Image not found (expired?)'}), 404
+    filename, png_bytes = recent
         
     try:
-        # Move image to output folder
-        target_path = os.path.join(server.output_folder, image_id)
-        
-        # Copy instead of move so we don't break subsequent saves if user clicks multiple times
-        import shutil
-        shutil.copy2(temp_path, target_path)
+        # Write image to output folder; the in-memory copy stays for repeated saves
+        target_path = os.path.join(server.output_folder, filename)
+        with open(target_path, 'wb') as f:
+            f.write(png_bytes)
         
         # Save metadata only if enabled
         if save_metadata:
@@ -835,18 +1144,16 @@ def delete_image():
         deleted = False
         messages = []
 
-        # 1. Delete from temp
-        temp_path = os.path.join('/tmp', image_id)
-        if os.path.exists(temp_path):
-            try:
-                os.remove(temp_path)
-                deleted = True
-                messages.append("Deleted from temp")
-            except Exception as e:
-                print(f"Error deleting from temp: {e}")
+        # 1. Drop the unsaved in-memory copy (image_id is then a generation id, not a file name)
+        filename = image_id
+        recent = server.recent_images.pop(image_id, None)
+        if recent is not None:
+            filename = recent[0]
+            deleted = True
+            messages.append("Deleted from temp")
 
         # 2. Delete from output if exists (in case it was saved)
-        output_path = os.path.join(server.output_folder, image_id)
+        output_path = os.path.join(server.output_folder, filename)
         if os.path.exists(output_path):
             try:
                 os.remove(output_path)
@@ -902,6 +1209,20 @@ def get_saved_images():
         print(f"Error fetching saved images: {e}")
         return jsonify({'images': []})
 
+@app.route('/api/recent/<image_id>', methods=['GET'])
+def get_recent_image(image_id):
+    """Serve a just-generated (not yet saved) image from memory"""
+    recent = server.recent_images.get(image_id) if server else None
+    if recent is None:
+        return jsonify({'error': 'Image not found'}), 404
+
+    # Ids are never reused, so a cached copy can't go stale
+    response = app.response_class(recent[1], mimetype='image/png')
+    response.cache_control.private = True
+    response.cache_control.max_age = 3600
+    return response
+
+
 @app.route('/api/image/<filename>', methods=['GET'])
 def get_image(filename):
     """Serve saved image from output folder"""
@@ -917,7 +1238,8 @@ def get_image(filename):
         if not file_path.exists():
             return jsonify({'error': 'Image not found'}), 404
         
-        return send_from_directory(server.output_folder, filename)
+        # Saved outputs are timestamped and never rewritten, so let the browser keep them
+        return send_from_directory(server.output_folder, filename, max_age=3600)
     
     except Exception as e:
         print(f"Error serving image: {e}")
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, List, Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class ModelCache:
+    """
+    LRU cache of loaded model instances (ImageGenerator / ImageDescriber) keyed by model id.
+
+    With max_parked > 0 or a max_parked_bytes budget, evicted models that support
+    park()/restore() are moved to host memory instead of being unloaded, so switching back
+    to them skips the disk load. The least recently parked ones are unloaded past either limit.
+    """
+
+    def __init__(self, max_resident: int = 1, max_parked: int = 0, max_parked_bytes: int = 0):
+        self.max_resident = max(1, int(max_resident))
+        self.max_parked = max(0, int(max_parked or 0))
+        self.max_parked_bytes = max(0, int(max_parked_bytes or 0))
+        self._models: "OrderedDict[str, Any]" = OrderedDict()
+        self._parked: "OrderedDict[str, Any]" = OrderedDict()
+        self._last_used: dict = {}  # model id -> time.monotonic() of its last use
+        self._lock = threading.RLock()
+
+    def __contains__(self, model_id: str) -> bool:
+        return model_id in self._models
+
+    def get(self, model_id: str) -> Optional[Any]:
+        with self._lock:
+            model = self._models.get(model_id)
+            if model is not None:
+                self._models.move_to_end(model_id)
+                self._last_used[model_id] = time.monotonic()
+            return model
+
+    def get_or_load(self, model_id: str, factory: Callable[[], Optional[Any]]) -> Optional[Any]:
+        """
+        Return the resident model for model_id, building it with factory() on a miss.
+
+        factory must return a loaded model, or None if loading failed. Least recently
+        used models are evicted *before* loading so the new weights don't have to
+        share VRAM with the ones being replaced.
+        """
+        with self._lock:
+            model = self.get(model_id)
+            if model is not None:
+                logger.info(f"Model cache hit: {model_id}")
+                return model
+
+            # Take the model out of the parked set first so evictions below can't push it out
+            model = self._parked.pop(model_id, None)
+
+            while len(self._models) >= self.max_resident:
+                oldest_id = next(iter(self._models))
+                self.evict(oldest_id)
+
+            if model is not None:
+                if model.restore():
+                    logger.info(f"Model restored from host memory: {model_id}")
+                    self._models[model_id] = model
+                    self._last_used[model_id] = time.monotonic()
+                    return model
+                self._unload(model_id, model)
+
+            model = factory()
+            if model is not None:
+                self._models[model_id] = model
+                self._last_used[model_id] = time.monotonic()
+            return model
+
+    def evict(self, model_id: str) -> None:
+        with self._lock:
+            model = self._models.pop(model_id, None)
+            self._last_used.pop(model_id, None)
+            if model is None:
+                return
+            if (self.max_parked or self.max_parked_bytes) and hasattr(model, 'park'):
+                try:
+                    if model.park():
+                        self._parked[model_id] = model
+                        logger.info(f"Parked model in host memory: {model_id}")
+                        self._trim_parked()
+                        return
+                except Exception as e:
+                    logger.error(f"Error parking model {model_id}: {e}")
+            self._unload(model_id, model)
+
+    def _trim_parked(self) -> None:
+        while self._parked:
+            parked_bytes = sum(getattr(m, 'parked_bytes', 0) for m in self._parked.values())
+            over_count = self.max_parked and len(self._parked) > self.max_parked
+            over_bytes = self.max_parked_bytes and parked_bytes > self.max_parked_bytes
+            if not (over_count or over_bytes):
+                break
+            self._unload(*self._parked.popitem(last=False))
+
+    def _unload(self, model_id: str, model: Any) -> None:
+        try:
+            model.unload_model()
+            logger.info(f"Evicted model from cache: {model_id}")
+        except Exception:
+            logger.exception(f"Error unloading model {model_id}")
+
+    def evict_idle(self, ttl: float) -> List[str]:
+        """Evict models not used for ttl seconds; returns their ids."""
+        with self._lock:
+            cutoff = time.monotonic() - ttl
+            idle = [model_id for model_id in self._models if self._last_used.get(model_id, 0) < cutoff]
+            for model_id in idle:
+                logger.info(f"Model idle for over {ttl:g}s: {model_id}")
+                self.evict(model_id)
+            return idle
+
+    def clear(self) -> None:
+        with self._lock:
+            for model_id in list(self._models):
+                self.evict(model_id)
+            while self._parked:
+                self._unload(*self._parked.popitem(last=False))
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class RequestBatcher:
+    """
+    Collect concurrent single-item requests into batches.
+
+    Callers block in submit() while a worker thread gathers up to max_batch items,
+    waiting at most max_wait_ms after the first one, and hands them to
+    run_batch(key, items) in one call. Items are only batched with others whose
+    (hashable) key is equal, e.g. the model instance that should process them.
+    """
+
+    def __init__(self, run_batch: Callable[[Any, List[Any]], List[Any]],
+                 max_batch: int = 4,
+                 max_wait_ms: float = 20):
+        self.run_batch = run_batch
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000
+        self._queue: "queue.Queue" = queue.Queue()
+        self._worker = threading.Thread(target=self._run, daemon=True, name='imgenie-batcher')
+        self._worker.start()
+
+    def submit(self, key: Any, item: Any) -> Any:
+        """Queue item and wait for its result."""
+        future = Future()
+        self._queue.put((key, item, future))
+        return future.result()
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+
+            # Group by key, keeping arrival order within each group
+            groups = {}
+            for key, item, future in batch:
+                groups.setdefault(key, []).append((item, future))
+
+            for key, entries in groups.items():
+                try:
+                    results = list(self.run_batch(key, [item for item, _ in entries]))
+                    if len(results) != len(entries):
+                        raise RuntimeError(f"run_batch returned {len(results)} results for {len(entries)} items")
+                    for (_, future), result in zip(entries, results):
+                        future.set_result(result)
+                except Exception as e:
+                    logger.error(f"Batch of {len(entries)} failed: {e}")
+                    # Callers block in submit() until their future resolves
+                    for _, future in entries:
+                        if not future.done():
+                            future.set_exception(e)
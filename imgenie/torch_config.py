@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+
+import torch
+
+
+def configure_cuda_math() -> None:
+    """
+    Process-wide math settings shared by all models. fp32 matmuls and convolutions (VAE,
+    schedulers, vision towers) may use TF32 tensor cores. cuDNN autotunes conv algorithms,
+    since requests mostly repeat the same few input and output sizes. Called once by each
+    entry point rather than as an import side effect.
+    """
+    torch.set_float32_matmul_precision("high")
+    torch.backends.cuda.matmul.allow_tf32 = True
+    torch.backends.cudnn.allow_tf32 = True
+    torch.backends.cudnn.benchmark = True
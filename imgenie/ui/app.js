@@ -39,8 +39,16 @@ document.addEventListener('DOMContentLoaded', async () => {
     updateResultsPanel();
     updateUIState();
 
-    // Start polling for status/memory updates
-    setInterval(checkModelStatus, 5000);
+    // Start polling for status/memory updates (paused while the tab is hidden)
+    startStatusPolling();
+    document.addEventListener('visibilitychange', () => {
+        if (document.hidden) {
+            stopStatusPolling();
+        } else {
+            checkModelStatus();
+            startStatusPolling();
+        }
+    });
 
     // Initial fetch of LoRAs
     fetchLoRAs();
@@ -208,6 +216,21 @@ async function checkModelStatus() {
     }
 }
 
+let statusPollTimer = null;
+
+function startStatusPolling() {
+    if (statusPollTimer === null) {
+        statusPollTimer = setInterval(checkModelStatus, 5000);
+    }
+}
+
+function stopStatusPolling() {
+    if (statusPollTimer !== null) {
+        clearInterval(statusPollTimer);
+        statusPollTimer = null;
+    }
+}
+
 function updateMemoryUsage(used, max) {
     const percent = Math.round((used / max) * 100);
     document.getElementById('memoryPercent').textContent = percent + '%';
@@ -459,6 +482,28 @@ function attachEventListeners() {
     setupCollapsibles();
 }
 
+// Open card per panel, so switching sections only touches the old and new card
+const activeCards = new Map();
+
+function cardScope(card) {
+    return card.closest('.controls-panel, .viewport-panel') || document;
+}
+
+function setActiveCard(card, active = true) {
+    const scope = cardScope(card);
+    const current = activeCards.get(scope);
+
+    if (!active) {
+        card.classList.remove('active');
+        if (current === card) activeCards.delete(scope);
+        return;
+    }
+    if (current === card) return;
+    if (current) current.classList.remove('active');
+    card.classList.add('active');
+    activeCards.set(scope, card);
+}
+
 function setupCollapsibles() {
     const cards = document.querySelectorAll('.card');
 
@@ -469,36 +514,16 @@ function setupCollapsibles() {
 
         // Skip collapsible for results card (always visible)
         if (card.classList.contains('results')) {
-            card.classList.add('active');
+            setActiveCard(card);
             return; // Skip adding click listener
         }
 
         // Initially expand first card, collapse others
-        if (index === 0) {
-            card.classList.add('active');
-        } else {
-            card.classList.remove('active');
-        }
+        setActiveCard(card, index === 0);
 
         header.addEventListener('click', (e) => {
             if (e.target.closest('button')) return; // Ignore button clicks
-
-            const isActive = card.classList.contains('active');
-
-            // Determine scope for collapsing siblings
-            const parentPanel = card.closest('.controls-panel, .viewport-panel');
-            const scope = parentPanel ? parentPanel : document;
-
-            // Close all in the same scope
-            scope.querySelectorAll('.card').forEach(c => {
-                if (c !== card) {
-                    c.classList.remove('active');
-                }
-            });
-
-            if (!isActive) {
-                card.classList.add('active');
-            }
+            setActiveCard(card, !card.classList.contains('active'));
         });
     });
 }
@@ -506,18 +531,7 @@ function setupCollapsibles() {
 function expandSection(sectionClass) {
     const section = document.querySelector(`.card.${sectionClass}`);
     if (section) {
-        // Determine scope
-        const parentPanel = section.closest('.controls-panel, .viewport-panel');
-        const scope = parentPanel ? parentPanel : document;
-
-        // Collapse all first in same scope
-        scope.querySelectorAll('.card').forEach(c => {
-            if (c !== section) {
-                c.classList.remove('active');
-            }
-        });
-
-        section.classList.add('active');
+        setActiveCard(section);
 
         // Scroll only if on mobile or if not in split view context
         if (window.innerWidth < 1024) {
@@ -738,7 +752,7 @@ function setupFileUpload(uploadAreaId, fileInputId, previewId, clearBtnId = null
         clearBtn.addEventListener('click', (e) => {
             e.stopPropagation();
             fileInput.value = '';
-            preview.innerHTML = '';
+            clearPreview(preview);
             clearBtn.style.display = 'none';
         });
     }
@@ -783,26 +797,49 @@ function handleFileSelect(fileInput, preview) {
     const file = fileInput.files[0];
     if (!file) {
         // Input cleared or empty, clear preview too
-        preview.innerHTML = '';
+        clearPreview(preview);
         return false;
     }
 
     if (!file.type.startsWith('image/')) {
         showToast('Please select an image file', 'error');
         fileInput.value = '';
-        preview.innerHTML = '';
+        clearPreview(preview);
         return false;
     }
 
-    const reader = new FileReader();
-    reader.onload = (e) => {
-        preview.innerHTML = `<img src="${e.target.result}" alt="Preview">`;
-        // showToast('Image loaded successfully', 'success');
-    };
-    reader.readAsDataURL(file);
+    // Reference the file via an object URL instead of base64-encoding it on the
+    // main thread, and let the browser decode it off-thread.
+    revokePreviewUrl(preview);
+    let img = preview.querySelector('img');
+    if (!img) {
+        img = document.createElement('img');
+        img.decoding = 'async';
+        img.alt = 'Preview';
+        preview.appendChild(img);
+    }
+    img.src = URL.createObjectURL(file);
+    img.style.display = '';
     return true;
 }
 
+function clearPreview(preview) {
+    // Keep the <img> element around and just reset it, instead of rebuilding the preview DOM
+    revokePreviewUrl(preview);
+    const img = preview.querySelector('img');
+    if (img) {
+        img.removeAttribute('src');
+        img.style.display = 'none';
+    }
+}
+
+function revokePreviewUrl(preview) {
+    const img = preview.querySelector('img');
+    if (img && img.src.startsWith('blob:')) {
+        URL.revokeObjectURL(img.src);
+    }
+}
+
 // ===========================
 // IMAGE GENERATION
 // ===========================
@@ -1416,6 +1453,9 @@ function displaySavedImages(images) {
         thumbItem.dataset.filename = image.filename;
 
         const img = document.createElement('img');
+        // Thumbnails are full-size outputs; only fetch/decode them once scrolled into view
+        img.loading = 'lazy';
+        img.decoding = 'async';
         img.src = image.path;
         img.alt = image.filename;
         img.addEventListener('click', () => loadSavedImage(image.filename, image.path));
@@ -1435,10 +1475,17 @@ function displaySavedImages(images) {
     });
 }
 
-function loadSavedImage(filename, imagePath) {
-    // Load image into main viewer
+async function loadSavedImage(filename, imagePath) {
+    // Load image into main viewer, decoding it off the main thread before the swap
     const generatedImage = document.getElementById('generatedImage');
     if (generatedImage) {
+        const loader = new Image();
+        loader.src = imagePath;
+        try {
+            await loader.decode();
+        } catch (e) {
+            console.error("Error decoding saved image", e);
+        }
         generatedImage.src = imagePath;
     }
 
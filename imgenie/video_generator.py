@@ -10,6 +10,12 @@ from PIL import Image
 from diffusers import CogVideoXImageToVideoPipeline
 from diffusers.utils import export_to_video
 
+# Run as a script (server, CLI) or imported as part of the imgenie package
+try:
+    from filename_table import FilenameTable
+except ImportError:
+    from imgenie.filename_table import FilenameTable
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -17,6 +23,9 @@ logger.setLevel(logging.INFO)
 # CogVideoX-5B Image-to-Video is a very capable open-source I2V model
 DEFAULT_MODEL_PATH = "THUDM/CogVideoX-5b-I2V"
 
+# str.translate table for output file names: keep alphanumerics, spaces and underscores
+_SAFE_FILENAME_TABLE = FilenameTable(keep=' _')
+
 
 class VideoGenerator:
     """Image-to-Video generator using reference image and text prompts."""
@@ -96,7 +105,7 @@ class VideoGenerator:
             reference_img = self._load_reference_image(ref_image_path)
 
             logger.info(f"Starting video generation with prompt: '{prompt}'")
-            with torch.no_grad():
+            with torch.inference_mode():
                 video_frames = self.pipeline(
                     prompt=prompt,
                     image=reference_img,
@@ -121,12 +130,14 @@ class VideoGenerator:
 
     def _get_timestamped_path(self, prompt: str) -> Path:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        safe_prompt = "".join(c for c in prompt[:20] if c.isalnum() or c in (' ', '_')).replace(" ", "_")
+        safe_prompt = prompt[:20].translate(_SAFE_FILENAME_TABLE).replace(" ", "_")
         return self.output_dir / f"{timestamp}_{safe_prompt}.mp4"
 
 
 if __name__ == "__main__":
     import sys
+    from torch_config import configure_cuda_math
+    configure_cuda_math()
     
     # Simple CLI tool to test it out
     if len(sys.argv) < 3:
@@ -0,0 +1,31 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'imgenie'))
+
+from filename_table import FilenameTable  # noqa: E402
+
+
+class FilenameTableTest(unittest.TestCase):
+
+    def test_generator_rules_drop_symbols(self):
+        table = FilenameTable(keep=' _')
+        self.assertEqual('a cat 🐱 — smiling’s'.translate(table).replace(' ', '_'), 'a_cat___smilings')
+
+    def test_server_rules_replace_symbols(self):
+        table = FilenameTable('_')
+        self.assertEqual('x\u2028y\u200bz'.translate(table), 'x_y_z')
+        self.assertEqual('a cat 🐱!'.translate(table), 'a_cat___')
+
+    def test_non_latin_letters_are_kept(self):
+        self.assertEqual('猫 ünï'.translate(FilenameTable('_')), '猫_ünï')
+
+    def test_matches_isalnum_filter(self):
+        text = ''.join(map(chr, range(0, 0x3000, 7)))
+        expected = ''.join(c for c in text if c.isalnum() or c in ' _')
+        self.assertEqual(text.translate(FilenameTable(keep=' _')), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
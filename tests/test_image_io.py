@@ -0,0 +1,35 @@
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'imgenie'))
+
+import image_io  # noqa: E402
+
+
+class FakeImage:
+
+    def __init__(self):
+        self.saved = threading.Event()
+        self.calls = []
+
+    def save(self, output_path, **kwargs):
+        self.calls.append((output_path, kwargs))
+        self.saved.set()
+
+
+class SavePngAsyncTest(unittest.TestCase):
+
+    def test_saves_fast_png_on_shared_pool(self):
+        pool = image_io._save_pool
+        image = FakeImage()
+        image_io.save_png_async(image, '/tmp/out.png')
+
+        self.assertTrue(image.saved.wait(5))
+        self.assertEqual(image.calls, [('/tmp/out.png', {'optimize': False, 'compress_level': 1})])
+        self.assertIs(image_io._save_pool, pool)
+
+
+if __name__ == '__main__':
+    unittest.main()
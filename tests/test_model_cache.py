@@ -0,0 +1,171 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'imgenie'))
+
+from model_cache import ModelCache  # noqa: E402
+
+
+class FakeModel:
+
+    def __init__(self, name):
+        self.name = name
+        self.loaded = True
+
+    def unload_model(self):
+        self.loaded = False
+
+
+class ModelCacheTest(unittest.TestCase):
+
+    def test_failing_factory_leaves_previous_model_evicted(self):
+        cache = ModelCache(max_resident=1)
+        old = cache.get_or_load('old', lambda: FakeModel('old'))
+
+        self.assertIsNone(cache.get_or_load('new', lambda: None))
+        self.assertFalse(old.loaded)
+        self.assertNotIn('old', cache)
+        self.assertNotIn('new', cache)
+
+    def test_raising_factory_propagates_and_caches_nothing(self):
+        cache = ModelCache(max_resident=1)
+        old = cache.get_or_load('old', lambda: FakeModel('old'))
+
+        def factory():
+            raise RuntimeError('out of memory')
+
+        with self.assertRaises(RuntimeError):
+            cache.get_or_load('new', factory)
+        self.assertFalse(old.loaded)
+        self.assertNotIn('old', cache)
+        self.assertIsNone(cache.get('new'))
+
+
+class ModelCacheIdleTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('model_cache.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_evicts_models_idle_past_ttl(self):
+        cache = ModelCache(max_resident=2)
+        a = cache.get_or_load('a', lambda: FakeModel('a'))
+        self.now += 10
+        b = cache.get_or_load('b', lambda: FakeModel('b'))
+        self.now += 25
+
+        self.assertEqual(cache.evict_idle(30), ['a'])
+        self.assertFalse(a.loaded)
+        self.assertTrue(b.loaded)
+        self.assertIn('b', cache)
+
+    def test_get_marks_model_as_used(self):
+        cache = ModelCache(max_resident=1)
+        a = cache.get_or_load('a', lambda: FakeModel('a'))
+        self.now += 25
+        cache.get('a')
+        self.now += 25
+
+        self.assertEqual(cache.evict_idle(30), [])
+        self.assertTrue(a.loaded)
+
+
+class ParkableModel(FakeModel):
+
+    def __init__(self, name, size=0, can_park=True, can_restore=True):
+        super().__init__(name)
+        self.size = size
+        self.can_park = can_park
+        self.can_restore = can_restore
+        self.parked = False
+        self.parked_bytes = 0
+
+    def park(self):
+        if not self.can_park:
+            return False
+        self.parked, self.parked_bytes = True, self.size
+        return True
+
+    def restore(self):
+        if not self.can_restore:
+            return False
+        self.parked, self.parked_bytes = False, 0
+        return True
+
+
+def failing_factory():
+    raise AssertionError('factory should not be called')
+
+
+class ModelCacheParkingTest(unittest.TestCase):
+
+    def test_switching_back_restores_parked_model(self):
+        cache = ModelCache(max_resident=1, max_parked=1)
+        a = cache.get_or_load('a', lambda: ParkableModel('a'))
+        cache.get_or_load('b', lambda: ParkableModel('b'))
+        self.assertTrue(a.parked)
+        self.assertTrue(a.loaded)
+        self.assertNotIn('a', cache)
+
+        self.assertIs(cache.get_or_load('a', failing_factory), a)
+        self.assertFalse(a.parked)
+        self.assertIn('a', cache)
+
+    def test_oldest_parked_model_is_unloaded_past_the_limit(self):
+        cache = ModelCache(max_resident=1, max_parked=1)
+        a = cache.get_or_load('a', lambda: ParkableModel('a'))
+        b = cache.get_or_load('b', lambda: ParkableModel('b'))
+        cache.get_or_load('c', lambda: ParkableModel('c'))
+
+        self.assertFalse(a.loaded)
+        self.assertTrue(b.parked)
+        self.assertTrue(b.loaded)
+
+    def test_models_that_decline_parking_are_unloaded(self):
+        cache = ModelCache(max_resident=1, max_parked=1)
+        a = cache.get_or_load('a', lambda: ParkableModel('a', can_park=False))
+        cache.get_or_load('b', lambda: ParkableModel('b'))
+        self.assertFalse(a.loaded)
+
+    def test_failed_restore_reloads_from_factory(self):
+        cache = ModelCache(max_resident=1, max_parked=1)
+        a = cache.get_or_load('a', lambda: ParkableModel('a', can_restore=False))
+        cache.get_or_load('b', lambda: ParkableModel('b'))
+
+        fresh = cache.get_or_load('a', lambda: ParkableModel('a'))
+        self.assertIsNot(fresh, a)
+        self.assertFalse(a.loaded)
+
+    def test_byte_budget_alone_enables_parking_and_bounds_it(self):
+        cache = ModelCache(max_resident=1, max_parked_bytes=10)
+        a = cache.get_or_load('a', lambda: ParkableModel('a', size=6))
+        b = cache.get_or_load('b', lambda: ParkableModel('b', size=6))
+        c = cache.get_or_load('c', lambda: ParkableModel('c', size=3))
+        cache.get_or_load('d', lambda: ParkableModel('d'))
+
+        # a (6) and b (6) exceed 10 bytes together, so a went; b + c fit
+        self.assertFalse(a.loaded)
+        self.assertTrue(b.parked and b.loaded)
+        self.assertTrue(c.parked and c.loaded)
+
+    def test_model_larger_than_byte_budget_is_unloaded(self):
+        cache = ModelCache(max_resident=1, max_parked_bytes=10)
+        a = cache.get_or_load('a', lambda: ParkableModel('a', size=20))
+        cache.get_or_load('b', lambda: ParkableModel('b'))
+        self.assertFalse(a.loaded)
+
+    def test_clear_unloads_parked_models(self):
+        cache = ModelCache(max_resident=1, max_parked=2)
+        a = cache.get_or_load('a', lambda: ParkableModel('a'))
+        b = cache.get_or_load('b', lambda: ParkableModel('b'))
+        cache.clear()
+        self.assertFalse(a.loaded)
+        self.assertFalse(b.loaded)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'imgenie'))
+
+from request_batcher import RequestBatcher  # noqa: E402
+
+
+class RequestBatcherTest(unittest.TestCase):
+
+    def test_groups_equal_keys(self):
+        calls = []
+
+        def run_batch(key, items):
+            calls.append((key, sorted(items)))
+            return [f"{key}:{item}" for item in items]
+
+        # Long wait so all four submissions land in the same collection window
+        batcher = RequestBatcher(run_batch, max_batch=4, max_wait_ms=5000)
+        submissions = [(('a', 1), 1), (('b', 2), 2), (('a', 1), 3), (('b', 2), 4)]
+        results = {}
+
+        def submit(key, item):
+            results[item] = batcher.submit(key, item)
+
+        threads = [threading.Thread(target=submit, args=args) for args in submissions]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=10)
+
+        self.assertEqual(sorted(calls), [(('a', 1), [1, 3]), (('b', 2), [2, 4])])
+        self.assertEqual(results, {1: "('a', 1):1", 2: "('b', 2):2", 3: "('a', 1):3", 4: "('b', 2):4"})
+
+    def test_short_result_list_fails_every_caller(self):
+        batcher = RequestBatcher(lambda key, items: items[:1], max_batch=2, max_wait_ms=1000)
+        errors = []
+
+        def submit(item):
+            try:
+                batcher.submit('key', item)
+            except RuntimeError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=submit, args=(i,)) for i in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=5)
+        self.assertFalse(any(thread.is_alive() for thread in threads))
+        self.assertEqual(len(errors), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()